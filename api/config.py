@@ -6,6 +6,15 @@ import os
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Connection pool per worker process; size it so workers * (size + overflow) stays under max_connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+# asyncpg prepared statements kept per connection, and SQLAlchemy compiled statements per
+# process. Per-tenant mapped classes compile separately, so the latter scales with tenants.
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", 500))
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", 2000))
+# Log every SQL statement (slow; for local debugging only)
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
 
 SMTP_HOST = os.getenv("SMTP_HOST")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
@@ -14,3 +23,19 @@ SMTP_PASS = os.getenv("SMTP_PASS")
 FROM_EMAIL = os.getenv("FROM_EMAIL")
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 PORT = int(os.getenv("PORT",8000))
+
+# Optional: hand document processing to a Celery worker pool (e.g. redis://localhost:6379/0)
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
+
+# Optional: cache the logged-in user's profile in Redis (e.g. redis://localhost:6379/1)
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Pre-provisioned empty tenant schemas kept ready for onboarding (0 disables the pool)
+TENANT_SCHEMA_POOL_SIZE = int(os.getenv("TENANT_SCHEMA_POOL_SIZE", 2))
+
+# Reuse LLM answers for the same question over the same retrieved chunks (0 disables)
+LLM_RESPONSE_CACHE_TTL = int(os.getenv("LLM_RESPONSE_CACHE_TTL", 300))
+LLM_RESPONSE_CACHE_SIZE = int(os.getenv("LLM_RESPONSE_CACHE_SIZE", 1000))
+
+# Build read schemas from ORM rows with model_construct (no re-validation); set to false to debug
+FAST_ORM_SERIALIZATION = os.getenv("FAST_ORM_SERIALIZATION", "true").lower() == "true"
@@ -1,11 +1,45 @@
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
-from api.config import DATABASE_URL
+from api.config import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    DB_PREPARED_STATEMENT_CACHE_SIZE,
+    DB_QUERY_CACHE_SIZE,
+    SQL_ECHO,
+)
 
 class Base(DeclarativeBase):
     pass
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+
+def _async_database_url(url: str) -> URL:
+    """
+    Point plain postgres:// / postgresql:// URLs at asyncpg instead of the sync psycopg2
+    default, and size asyncpg's per-connection prepared statement cache unless the URL
+    already does.
+    """
+    for prefix in ("postgres://", "postgresql://", "postgresql+psycopg2://"):
+        if url.startswith(prefix):
+            url = "postgresql+asyncpg://" + url[len(prefix):]
+            break
+    parsed = make_url(url)
+    if parsed.drivername == "postgresql+asyncpg" and "prepared_statement_cache_size" not in parsed.query:
+        parsed = parsed.update_query_dict(
+            {"prepared_statement_cache_size": str(DB_PREPARED_STATEMENT_CACHE_SIZE)}
+        )
+    return parsed
+
+
+engine = create_async_engine(
+    _async_database_url(DATABASE_URL),
+    echo=SQL_ECHO,
+    query_cache_size=DB_QUERY_CACHE_SIZE,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
 async def get_unscoped_db_session() -> AsyncSession:
@@ -1,11 +1,31 @@
+import re
 from contextvars import ContextVar
+from functools import lru_cache
 from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy import text
-from .database import AsyncSessionLocal
+from .database import AsyncSessionLocal, engine
 
 tenant_schema: ContextVar[str] = ContextVar("tenant_schema", default="public")
 
+# Tenant schema names are plain identifiers; anything else is rejected at the auth layer
+SCHEMA_NAME_RE = re.compile(r"^[a-zA-Z0-9_]+$")
+
+# One constant statement for every tenant, so Postgres and asyncpg reuse the prepared
+# statement instead of parsing a new SET per schema. Session-level (is_local=false) like
+# the SET it replaces, since callers commit mid-request and keep using the session.
+_SET_SEARCH_PATH = text("SELECT set_config('search_path', :search_path, false)")
+
+
+def is_valid_schema_name(schema: str) -> bool:
+    return bool(schema) and SCHEMA_NAME_RE.match(schema) is not None
+
+
+async def set_search_path(session: AsyncSession, schema: str) -> None:
+    """Point the session's search_path at `schema` through a bound parameter."""
+    await session.execute(_SET_SEARCH_PATH, {"search_path": f'"{schema}"'})
+
+
 # --- DEPENDENCY #1: For Tenant-Specific Operations ---
 async def get_db_tenant() -> AsyncGenerator[AsyncSession, None]:
     """
@@ -16,7 +36,7 @@ async def get_db_tenant() -> AsyncGenerator[AsyncSession, None]:
     """
     schema = tenant_schema.get()
     async with AsyncSessionLocal() as session:
-        await session.execute(text(f'SET search_path TO "{schema}"'))
+        await set_search_path(session, schema)
         yield session
 
 # --- DEPENDENCY #2: For Public/Global Operations ---
@@ -29,5 +49,25 @@ async def get_db_public() -> AsyncGenerator[AsyncSession, None]:
     """
     print("Using public schema for database operations")
     async with AsyncSessionLocal() as session:
-        await session.execute(text('SET search_path TO "public"'))
-        yield session
\ No newline at end of file
+        await set_search_path(session, "public")
+        yield session
+
+# --- DEPENDENCY #3: Tenant session via schema_translate_map ---
+@lru_cache(maxsize=1024)
+def get_tenant_engine(schema: str) -> AsyncEngine:
+    """
+    Returns an engine view (sharing the main pool) that renders schema-less
+    blueprint tables as "<schema>".<table>. SQLAlchemy caches compiled SQL per
+    translate map, so this avoids mutating Table.schema at runtime.
+    """
+    return engine.execution_options(schema_translate_map={None: schema})
+
+
+async def get_db_tenant_translated() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Yields a session whose blueprint tables are qualified with the current
+    tenant's schema through schema_translate_map instead of search_path.
+    """
+    schema = tenant_schema.get()
+    async with AsyncSession(bind=get_tenant_engine(schema), expire_on_commit=False) as session:
+        yield session
@@ -1,6 +1,6 @@
 import traceback
 from fastapi import Depends, FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, RedirectResponse
 from contextlib import asynccontextmanager
 from sqlalchemy import text
 from api.db.database import Base, engine
@@ -18,7 +18,12 @@ from api.models.knowledge_base import KnowledgeBase
 from api.models.audit_log import AuditLogBase
 from api.models.category import Category
 from api.models.vector_doc import VectorDoc
+from api.models.tenant_schema_pool import TenantSchemaPool
 from api.routers.reserved_subdomain_router import router as reserved_subdomain_router
+from api.services.providers import init_services
+from api.services.onboarding_service import apply_tenant_migrations, replenish_schema_pool
+from api.utils.process_pool import shutdown_process_pool
+from api.utils.redis_client import close_redis
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -54,13 +59,29 @@ async def lifespan(app: FastAPI):
             table for table in Base.metadata.sorted_tables if table.schema == "public"
         ]
         await conn.run_sync(Base.metadata.create_all, tables=public_tables)
+        # create_all does not add columns to tables that already exist
+        await conn.execute(text(
+            "ALTER TABLE public.otp ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0"
+        ))
+
+        # Add columns introduced after existing tenants were provisioned
+        await apply_tenant_migrations(conn)
+
+    # Pre-build empty tenant schemas so signups only rename one
+    await replenish_schema_pool()
+
+    # Shared RAG/KB/LLM services live on app.state, one set per worker process
+    init_services(app)
     yield
+    shutdown_process_pool()
+    await close_redis()
 
 app = FastAPI(
     title="CRM APP",
     description="CRM APP",
     version="3.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     dependencies=[Depends(get_tenant_id)]
 )
 
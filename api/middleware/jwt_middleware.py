@@ -7,7 +7,7 @@ from starlette.responses import JSONResponse
 
 from api import config
 from api.utils.security import decode_jwt_token
-from api.db.tenant import tenant_schema
+from api.db.tenant import is_valid_schema_name, tenant_schema
 
 # --- Configuration ---
 
@@ -38,8 +38,7 @@ async def get_current_user(
     try:
         payload = decode_jwt_token(token=token)
         current_schema=tenant_schema.get()
-        print(current_schema,tenant_schema.get(),"TENANTT")
-        if current_schema!=payload.get("tenant"):
+        if current_schema!=payload.get("tenant") or not is_valid_schema_name(current_schema):
             raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid Token 1",
@@ -1,6 +1,6 @@
 from fastapi import Header, Request, HTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy import select, text
+from sqlalchemy import select
 from api.db.tenant import tenant_schema 
 from api.db.database import AsyncSessionLocal 
 from api.models.organization import Organization 
@@ -23,9 +23,8 @@ class TenantMiddleware(BaseHTTPMiddleware):
 
 
         async with AsyncSessionLocal() as session:
-            # The database logic remains the same. We still look up the organization
-            # in the public schema to get the actual schema name.
-            await session.execute(text('SET search_path TO "public"'))
+            # Look up the organization to get the actual schema name. Organization is
+            # qualified with the public schema, so no search_path round-trip is needed.
             stmt = select(Organization).where(Organization.subdomain == subdomain)
             result = await session.execute(stmt)
             organization = result.scalar_one_or_none()
@@ -1,4 +1,5 @@
 import uuid
+from functools import lru_cache
 from datetime import datetime
 from sqlalchemy import String, DateTime, func
 from sqlalchemy.orm import Mapped, mapped_column, declarative_base, relationship
@@ -6,12 +7,17 @@ from api.db.database import Base
 
 class CategoryBase:
     __abstract__ = True
+    # created_at/updated_at come back in the INSERT/UPDATE's RETURNING, so callers
+    # never need a refresh() after commit
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    # Unique per tenant schema; PostgreSQL names the backing index categories_name_key
+    name: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+@lru_cache(maxsize=512)
 def get_category_model(schema: str, *, DynamicBase=None):
     # use caller's registry to keep everything in the same mapping context
     DynamicBase = DynamicBase or declarative_base()
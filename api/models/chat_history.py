@@ -1,11 +1,13 @@
 # api/models/chat_history.py
 import uuid
+from functools import lru_cache
 from datetime import datetime
 
 from sqlalchemy import (
     String,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     Text,
     JSON,
@@ -20,6 +22,8 @@ class ChatHistoryBase:
     Abstract base for chat history.
     """
     __abstract__ = True
+    # Return server-generated timestamps from the INSERT itself instead of a refresh()
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, default=lambda: str(uuid.uuid4())
@@ -42,12 +46,16 @@ class ChatHistoryBase:
 
 
 # ✅ Dynamic factory for multi-tenancy
+@lru_cache(maxsize=512)
 def get_chat_history_model(schema: str):
     DynamicBase = declarative_base()
 
     class ChatHistoryForSchema(DynamicBase, ChatHistoryBase):
         __tablename__ = "chat_history"
-        __table_args__ = {"schema": schema}
+        __table_args__ = (
+            Index("ix_chat_history_created_id", "created_at", "id"),
+            {"schema": schema},
+        )
 
     return ChatHistoryForSchema
 
@@ -55,3 +63,5 @@ def get_chat_history_model(schema: str):
 # ✅ Default/global schema model
 class ChatHistory(Base, ChatHistoryBase):
     __tablename__ = "chat_history"
+    # Keyset pagination for get_all_chat_records (scanned backwards for newest-first)
+    __table_args__ = (Index("ix_chat_history_created_id", "created_at", "id"),)
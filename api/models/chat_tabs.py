@@ -1,14 +1,21 @@
 import uuid
-from sqlalchemy import Column, ForeignKey, String, Table, Text
+from sqlalchemy import Column, ForeignKey, Index, String, Table, Text, text
 from sqlalchemy.orm import Mapped, mapped_column, declarative_base
 from api.db.database import Base
 
-# Association for ChatTab <-> ChatHistory (this can stay registry-agnostic)
+# Name of the per-user default tab used by the KB chat endpoint
+KB_CHAT_TAB_NAME = "KB Chat"
+
+# Association for ChatTab <-> ChatHistory (this can stay registry-agnostic).
+# The (chat_tab_id, chat_history_id) primary key already serves the per-tab message
+# joins; the second index covers the reverse side, which the ON DELETE CASCADE from
+# chat_history probes for every deleted message.
 chat_tab_history_association = Table(
     "chat_tab_history_association",
     Base.metadata,
     Column("chat_tab_id", String(36), ForeignKey("chat_tabs.id", ondelete="CASCADE"), primary_key=True),
     Column("chat_history_id", String(36), ForeignKey("chat_history.id", ondelete="CASCADE"), primary_key=True),
+    Index("idx_chat_tab_history_chat_history_id", "chat_history_id"),
 )
 
 class ChatTabBase:
@@ -49,3 +56,13 @@ def get_chat_tabs_model(schema: str, *, DynamicBase=None):
 
 class ChatTab(Base, ChatTabBase):
     __tablename__ = "chat_tabs"
+    # Partial unique index backing the KB Chat tab upsert (one per user)
+    __table_args__ = (
+        Index(
+            "uq_chat_tabs_user_kb_chat",
+            "user_id",
+            "name",
+            unique=True,
+            postgresql_where=text(f"name = '{KB_CHAT_TAB_NAME}'"),
+        ),
+    )
@@ -1,7 +1,8 @@
 import uuid
 from datetime import datetime
+from functools import lru_cache
 from enum import Enum as PyEnum
-from sqlalchemy import String, DateTime, Enum, ForeignKey, Integer, Text, func
+from sqlalchemy import String, DateTime, Enum, ForeignKey, Index, Integer, Text, func, text
 from sqlalchemy.orm import Mapped, mapped_column, declarative_base, relationship
 from api.db.database import Base
 
@@ -32,11 +33,16 @@ class KnowledgeBaseBase:
 	s3_url: Mapped[str] = mapped_column(Text, nullable=True)
 	mime: Mapped[str] = mapped_column(String(255), nullable=True)
 	file_size: Mapped[int] = mapped_column(Integer, nullable=True)
+	# SHA-256 of the uploaded bytes; lets identical re-uploads reuse existing vectors
+	file_hash: Mapped[str] = mapped_column(String(64), nullable=True, index=True)
 
 	created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 	updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+@lru_cache(maxsize=512)
 def get_knowledge_base_model(schema: str, *, DynamicBase=None):
+	# Cached per schema: rebuilding the mapped class on every call would defeat
+	# SQLAlchemy's compiled-statement cache and leak declarative classes
 	DynamicBase = DynamicBase or declarative_base()
 
 	class KnowledgeBaseSchema(DynamicBase, KnowledgeBaseBase):
@@ -59,6 +65,22 @@ def get_knowledge_base_model(schema: str, *, DynamicBase=None):
 
 class KnowledgeBase(Base, KnowledgeBaseBase):
 	__tablename__ = "knowledge_base"
-	# No __table_args__ means this is a blueprint for tenant schemas
+	# No schema in __table_args__ means this is a blueprint for tenant schemas
+	__table_args__ = (
+		# Covers the paginated per-user document listing
+		Index(
+			"ix_kb_user_created",
+			"user_id",
+			text("created_at DESC"),
+			postgresql_include=["file_name", "category_id", "mime", "file_size", "status", "s3_url"],
+		),
+	)
 	# Back-populates from VectorDoc
 	vector_docs = relationship("VectorDoc", back_populates="file", cascade="all, delete-orphan")
+
+
+def resolve_knowledge_base_model(tenant_schema: str):
+	"""Return the public blueprint model or the cached tenant-specific model."""
+	if tenant_schema != "public":
+		return get_knowledge_base_model(tenant_schema)
+	return KnowledgeBase
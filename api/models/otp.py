@@ -14,5 +14,7 @@ class OTP(Base):
     email = Column(String, unique=True, nullable=False)
     otp = Column(Integer, nullable=False)
     expires_at = Column(DateTime, nullable=False, default=lambda: datetime.now() + timedelta(minutes=5))  # ✅ OTP expires in 5 min
+    # Wrong guesses against this code; reset whenever a new code is issued
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, nullable=False, default=datetime.now)
     updated_at = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
@@ -11,6 +11,8 @@ class ReservedSubdomain(Base):
     """
     __tablename__ = "reserved_subdomains"
     __table_args__ = {"schema": "public"}
+    # created_at comes back in the INSERT's RETURNING, so no refresh() after commit
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, default=lambda: str(uuid.uuid4())
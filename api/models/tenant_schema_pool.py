@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import String, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+from api.db.database import Base
+
+class TenantSchemaPool(Base):
+    """
+    Tenant schemas created ahead of time, with every tenant table already in place.
+    Onboarding claims one and renames it instead of running the DDL in the request.
+    """
+    __tablename__ = "tenant_schema_pool"
+    __table_args__ = {"schema": "public"}
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
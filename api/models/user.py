@@ -1,4 +1,5 @@
 import uuid
+from functools import lru_cache
 from datetime import datetime
 from enum import Enum as PyEnum
 from sqlalchemy import Boolean, Column, DateTime, Enum, String, func, ForeignKey, Table
@@ -23,6 +24,8 @@ user_categories = Table(
 
 class UserBase:
     __abstract__ = True
+    # Fetch server-generated created_at/updated_at in the INSERT's RETURNING
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -36,7 +39,10 @@ class UserBase:
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+@lru_cache(maxsize=512)
 def get_user_model(schema: str, DynamicBase=None):
+    # Cached per schema like get_knowledge_base_model: one mapped class per tenant
+    # instead of a new declarative registry on every request.
     # Single registry for ALL per-schema classes
     if DynamicBase is None:
         DynamicBase = declarative_base()
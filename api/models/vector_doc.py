@@ -1,5 +1,6 @@
 # api/models/vector_doc.py
 import uuid
+from functools import lru_cache
 from datetime import datetime
 
 from sqlalchemy import (
@@ -10,10 +11,11 @@ from sqlalchemy import (
     Text,
     func,
     JSON,
+    Index,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship, declarative_base, declared_attr
 from api.db.database import Base
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC
 
 
 class VectorDocBase:
@@ -53,7 +55,7 @@ class VectorDocBase:
     chunk_id: Mapped[int] = mapped_column(Integer, nullable=False)
     chunk_text: Mapped[str] = mapped_column(Text, nullable=False)
 
-    embedding: Mapped[list[float]] = mapped_column(Vector(768), nullable=False)
+    embedding: Mapped[list[float]] = mapped_column(HALFVEC(768), nullable=False)
 
     # Avoid reserved attribute name clash with SQLAlchemy's class-level `metadata`
     doc_metadata: Mapped[dict] = mapped_column(JSON, nullable=True)
@@ -66,6 +68,7 @@ class VectorDocBase:
     )
 
 
+@lru_cache(maxsize=512)
 def get_vector_doc_model(schema: str, DynamicBase=None):
     if DynamicBase is None:
         DynamicBase = declarative_base()
@@ -100,7 +103,7 @@ def get_vector_doc_model(schema: str, DynamicBase=None):
         chunk_id: Mapped[int] = mapped_column(Integer, nullable=False)
         chunk_text: Mapped[str] = mapped_column(Text, nullable=False)
 
-        embedding: Mapped[list[float]] = mapped_column(Vector(768), nullable=False)
+        embedding: Mapped[list[float]] = mapped_column(HALFVEC(768), nullable=False)
 
         # Avoid reserved attribute name clash with SQLAlchemy's class-level `metadata`
         doc_metadata: Mapped[dict] = mapped_column(JSON, nullable=True)
@@ -117,4 +120,14 @@ def get_vector_doc_model(schema: str, DynamicBase=None):
 
 class VectorDoc(Base, VectorDocBase):
     __tablename__ = "vector_doc"
-    # No __table_args__ means this is a blueprint for tenant schemas
+    # No schema in __table_args__ means this is a blueprint for tenant schemas
+    __table_args__ = (
+        Index("idx_vector_doc_category_id", "category_id"),
+        Index(
+            "idx_vector_doc_embedding_hnsw_halfvec",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "halfvec_cosine_ops"},
+        ),
+    )
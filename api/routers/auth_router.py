@@ -1,6 +1,5 @@
 # File: api/routers/auth.py
 from http import HTTPStatus
-import random
 import uuid
 import enum
 from datetime import datetime, timedelta
@@ -14,6 +13,7 @@ from api.db.tenant import get_db_public, get_db_tenant
 from api.models.otp import OTP
 from api.models.organization import Organization
 from api.schemas.auth import LoginRequest
+from api.middleware.jwt_middleware import get_current_user
 from api.services.auth_service import AuthService
 from api.schemas.organization import CreateOrganizationRequest
 
@@ -32,6 +32,10 @@ async def verify_otp(email: str, otp: int, db: AsyncSession = Depends(get_db_pub
 async def login(request:LoginRequest, db: AsyncSession = Depends(get_db_tenant)):
     return await AuthService(db).login(email=request.email, password=request.password)
 
+@router.post("/logout")
+async def logout(current_user: dict = Depends(get_current_user), db: AsyncSession = Depends(get_db_tenant)):
+    return await AuthService(db).logout(current_user["sub"])
+
 @router.post("/create-organization")
 async def create_organization(
     payload: CreateOrganizationRequest,
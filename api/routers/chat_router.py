@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+import logging
+import time
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 
 # Import the correct tenant-aware dependency
-from api.db.tenant import get_db_tenant
+from api.db.database import AsyncSessionLocal
+from api.db.tenant import get_db_tenant, set_search_path
 
 # Import the schemas and the new service
 from api.schemas.chat_history import (
     ChatHistoryCreate,
     ChatHistoryRead,
+    ChatHistoryPage,
     ChatTabCreate,
     ChatTabRead,
     ChatSendRequest,
@@ -16,13 +22,17 @@ from api.schemas.chat_history import (
     ChatInitiateRequest,
     ChatInitiateResponse,
 )
+from api.schemas.base import orjson_list_response
 from api.services.chat_service import ChatHistoryService
 from api.middleware.jwt_middleware import get_current_user
 from api.services.rag_service import RAGService
 from api.services.llm_service import LLMService
+from api.services.providers import get_llm_service, get_rag_service
+from api.utils.response import sse_event
 
 # Initialize the router
 router = APIRouter(prefix="/api/chat", tags=["Chat"])
+logger = logging.getLogger(__name__)
 
 @router.post("/", response_model=ChatHistoryRead, status_code=201, summary="Create a new chat history record")
 async def create_chat_history(
@@ -38,17 +48,41 @@ async def create_chat_history(
     return new_record
 
 
-@router.get("/", response_model=List[ChatHistoryRead], summary="Get all chat history records for the tenant")
+@router.post(
+    "/batch",
+    status_code=201,
+    responses={201: {"model": List[ChatHistoryRead]}},
+    summary="Create several chat history records at once",
+)
+async def create_chat_history_batch(
+    data: List[ChatHistoryCreate],
+    db: AsyncSession = Depends(get_db_tenant)
+):
+    """
+    Creates several chat history records in one INSERT and one commit for the
+    currently authenticated tenant.
+    """
+    service = ChatHistoryService(db)
+    records = await service.create_chat_records(data)
+    return orjson_list_response((ChatHistoryRead.from_orm_fast(record) for record in records), status_code=201)
+
+
+@router.get("/", responses={200: {"model": List[ChatHistoryRead]}}, summary="Get all chat history records for the tenant")
 async def get_chat_history(
+    limit: int = Query(50, ge=1, le=200),
+    before_created_at: Optional[datetime] = Query(None, description="created_at of the last record on the previous page"),
+    before_id: Optional[str] = Query(None, description="id of the last record on the previous page"),
     db: AsyncSession = Depends(get_db_tenant) # <-- Use the tenant session
 ):
     """
-    Retrieves a list of all chat history records for the currently
-    authenticated tenant.
+    Retrieves chat history records for the currently authenticated tenant,
+    newest first, one keyset page at a time.
     """
+    if (before_created_at is None) != (before_id is None):
+        raise HTTPException(status_code=400, detail="before_created_at and before_id must be given together")
     service = ChatHistoryService(db)
-    records = await service.get_all_chat_records()
-    return records
+    records = await service.get_all_chat_records(limit, before_created_at, before_id)
+    return orjson_list_response(ChatHistoryRead.from_orm_fast(record) for record in records)
 
 
 # --- Chat Tabs (sessions) ---
@@ -73,29 +107,48 @@ async def list_chat_tabs(
     return tabs
 
 
-@router.get("/tabs/{tab_id}/messages", response_model=List[ChatHistoryRead], summary="List messages in a session")
+@router.get("/tabs/{tab_id}/messages", responses={200: {"model": List[ChatHistoryRead]}}, summary="List messages in a session")
 async def list_tab_messages(
     tab_id: str,
     db: AsyncSession = Depends(get_db_tenant),
 ):
     service = ChatHistoryService(db)
     messages = await service.get_tab_messages(tab_id)
-    return messages
+    return orjson_list_response(ChatHistoryRead.from_orm_fast(message) for message in messages)
 
 
-@router.post("/tabs/{tab_id}/send", response_model=ChatSendResponse, summary="Send a message in a session with context")
+@router.get(
+    "/tabs/{tab_id}/messages/columnar",
+    responses={200: {"model": ChatHistoryPage}},
+    summary="List messages in a session as packed columns",
+)
+async def list_tab_messages_columnar(
+    tab_id: str,
+    db: AsyncSession = Depends(get_db_tenant),
+):
+    service = ChatHistoryService(db)
+    page = await service.get_tab_messages_page(tab_id)
+    return page.to_response()
+
+
+@router.post(
+    "/tabs/{tab_id}/send",
+    responses={200: {"model": ChatSendResponse}},
+    summary="Send a message in a session with context",
+)
 async def send_message(
     tab_id: str,
     req: ChatSendRequest,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db_tenant),
+    rag_service: RAGService = Depends(get_rag_service),
+    llm_service: LLMService = Depends(get_llm_service),
 ):
     # Build prior conversation context
     service = ChatHistoryService(db)
     history_context = await service.build_history_context(tab_id)
 
     # RAG: get accessible categories for this user and search
-    rag_service = RAGService(embedding_model="google", api_key=None)
     accessible_categories = await rag_service.get_accessible_categories(
         current_user["sub"], current_user["tenant"], db
     )
@@ -112,8 +165,7 @@ async def send_message(
     )
 
     # LLM generate with history context
-    llm = LLMService(model=req.model)
-    answer = await llm.generate_response(req.query, search_results, history_context)
+    answer = await llm_service.generate_response(req.query, search_results, history_context, model=req.model)
 
     # Persist chat message and link to tab
     message = await service.append_message_to_tab(
@@ -128,32 +180,104 @@ async def send_message(
         ),
     )
 
-    return ChatSendResponse(
-        message=message,
+    return ChatSendResponse.model_construct(
+        message=ChatHistoryRead.from_orm_fast(message),
         sources=[doc.chunk_text for doc, _ in search_results],
         total_sources=len(search_results),
         processing_time_ms=0.0,  # could be measured if needed
+    ).to_response()
+
+
+@router.post("/tabs/{tab_id}/send/stream", summary="Send a message in a session with context (streamed)")
+async def send_message_stream(
+    tab_id: str,
+    req: ChatSendRequest,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db_tenant),
+    rag_service: RAGService = Depends(get_rag_service),
+    llm_service: LLMService = Depends(get_llm_service),
+):
+    """
+    Streaming variant of /tabs/{tab_id}/send as Server-Sent Events.
+
+    Emits a `sources` event once retrieval finishes, `delta` events while the LLM
+    generates, and a final `done` event carrying the saved message.
+    """
+    start_time = time.perf_counter()
+    tenant = current_user["tenant"]
+    history_context = await ChatHistoryService(db).build_history_context(tab_id)
+
+    accessible_categories = await rag_service.get_accessible_categories(current_user["sub"], tenant, db)
+    if not accessible_categories:
+        raise HTTPException(status_code=403, detail="No accessible categories found")
+
+    search_results = await rag_service.search_similar_documents(
+        req.query,
+        [current_user["role"]],
+        accessible_categories,
+        db,
+        req.top_k,
+        tenant,
+    )
+    sources = [doc.chunk_text for doc, _ in search_results]
+
+    async def event_stream():
+        yield sse_event({"sources": sources, "total_sources": len(sources)})
+
+        parts = []
+        async for delta in llm_service.stream_response(req.query, search_results, history_context, model=req.model):
+            parts.append(delta)
+            yield sse_event({"delta": delta})
+
+        # The answer is written once, after the last token; the request session may
+        # already be released, so persist on a fresh one
+        saved = None
+        try:
+            async with AsyncSessionLocal() as session:
+                await set_search_path(session, tenant)
+                message = await ChatHistoryService(session).append_message_to_tab(
+                    tab_id,
+                    ChatHistoryCreate(question=req.query, answer="".join(parts)),
+                )
+            saved = ChatHistoryRead.from_orm_fast(message).model_dump(mode="json")
+        except Exception as e:
+            logger.error(f"Failed to save streamed chat turn: {str(e)}")
+
+        yield sse_event({
+            "done": True,
+            "message": saved,
+            "processing_time_ms": (time.perf_counter() - start_time) * 1000,
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
-@router.post("/initiate", response_model=ChatInitiateResponse, summary="Initiate a new chat with first message")
+@router.post(
+    "/initiate",
+    responses={200: {"model": ChatInitiateResponse}},
+    summary="Initiate a new chat with first message",
+)
 async def initiate_new_chat(
     req: ChatInitiateRequest,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db_tenant),
+    rag_service: RAGService = Depends(get_rag_service),
+    llm_service: LLMService = Depends(get_llm_service),
 ):
     """
     Initiates a new chat by creating a new tab and sending the first message.
     This combines tab creation and first message sending in a single operation.
     """
-    import time
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     # Generate tab name if not provided (use first 50 chars of query)
     tab_name = req.tab_name or req.query[:50] + ("..." if len(req.query) > 50 else "")
     
     # RAG: get accessible categories for this user and search
-    rag_service = RAGService(embedding_model="google", api_key=None)
     accessible_categories = await rag_service.get_accessible_categories(
         current_user["sub"], current_user["tenant"], db
     )
@@ -170,8 +294,7 @@ async def initiate_new_chat(
     )
 
     # LLM generate (no history context for first message)
-    llm = LLMService(model=req.model)
-    answer = await llm.generate_response(req.query, search_results, "")
+    answer = await llm_service.generate_response(req.query, search_results, "", model=req.model)
 
     # Create chat tab and first message in single transaction
     service = ChatHistoryService(db)
@@ -188,12 +311,12 @@ async def initiate_new_chat(
         ),
     )
 
-    processing_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+    processing_time = (time.perf_counter() - start_time) * 1000  # Convert to milliseconds
 
-    return ChatInitiateResponse(
-        tab=tab,
-        message=message,
+    return ChatInitiateResponse.model_construct(
+        tab=ChatTabRead.from_orm_fast(tab),
+        message=ChatHistoryRead.from_orm_fast(message),
         sources=[doc.chunk_text for doc, _ in search_results],
         total_sources=len(search_results),
         processing_time_ms=processing_time,
-    )
\ No newline at end of file
+    ).to_response()
\ No newline at end of file
@@ -1,12 +1,16 @@
+import asyncio
 import logging
+import time
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import update
 
-from api.models.knowledge_base import KBStatus, get_knowledge_base_model, KnowledgeBase
+from api.models.knowledge_base import KBStatus, resolve_knowledge_base_model
+from api.schemas.base import orjson_list_response
 from api.schemas.rag_schemas import (
     KnowledgeBaseCreate, KnowledgeBaseResponse,
     RAGQueryRequest, RAGQueryResponse, VectorDocumentResponse,
@@ -17,23 +21,28 @@ from api.services.llm_service import LLMService
 from api.middleware.jwt_middleware import get_current_user
 from api.services.chat_service import ChatHistoryService
 from api.schemas.chat_history import ChatHistoryCreate
-from api.db.tenant import get_db_tenant
+from api.db.database import AsyncSessionLocal
+from api.db.tenant import get_db_tenant, set_search_path
 from api.services.kb_service import KnowledgeBaseService
+from api.services.providers import get_kb_service, get_llm_service, get_rag_service
+from api.utils.embedding_codec import encode_embedding_b64
+from api.utils.response import sse_event
+from api.utils.uploads import discard_upload, spool_upload
+from api.worker import enqueue_document_processing
 
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/kb", tags=["Knowledge Base"])
-
-# Service instances
-rag_service = RAGService(embedding_model="google", api_key=None)
-kb_service = KnowledgeBaseService(rag_service)
-llm_service = LLMService(model="openai")
+router = APIRouter(
+    prefix="/api/kb",
+    tags=["Knowledge Base"],
+    default_response_class=ORJSONResponse,
+)
 
 
 def _create_knowledge_base_response(doc) -> KnowledgeBaseResponse:
-    """Create a KnowledgeBaseResponse from a document model."""
-    return KnowledgeBaseResponse(
+    """Create a KnowledgeBaseResponse from a document model without re-validating the row."""
+    return KnowledgeBaseResponse.model_construct(
         id=doc.id,
         user_id=doc.user_id,
         file_name=doc.file_name,
@@ -41,52 +50,57 @@ def _create_knowledge_base_response(doc) -> KnowledgeBaseResponse:
         mime=doc.mime or "",
         file_size=doc.file_size or 0,
         status=doc.status,
-        json=doc.json,
+        json_data=doc.json,
         s3_url=doc.s3_url,
         created_at=doc.created_at,
         updated_at=doc.updated_at,
     )
 
 
-def _create_vector_document_response(doc, score: float) -> VectorDocumentResponse:
-    """Create a VectorDocumentResponse from a document and similarity score."""
-    return VectorDocumentResponse(
+def _create_vector_document_response(
+    doc, score: float, include_embedding: bool = False, embedding_format: str = "float"
+) -> VectorDocumentResponse:
+    """Create a VectorDocumentResponse from a document and similarity score.
+
+    Uses model_construct since the values come straight from our own rows.
+    """
+    embedding = embedding_b64 = None
+    if include_embedding:
+        if embedding_format == "base64":
+            embedding_b64 = encode_embedding_b64(doc.embedding)
+        else:
+            embedding = doc.embedding.to_list()
+    return VectorDocumentResponse.model_construct(
         id=doc.id,
         user_id=doc.user_id,
         category_id=doc.category_id,
         file_id=doc.file_id,
         chunk_id=doc.chunk_id,
         chunk_text=doc.chunk_text,
-        embedding=doc.embedding,
-        metadata=doc.doc_metadata or {},
+        embedding=embedding,
+        embedding_b64=embedding_b64,
+        doc_metadata=doc.doc_metadata or {},
         created_at=doc.created_at,
         updated_at=doc.updated_at,
     )
 
 
 async def _validate_document_access(
+    kb_service: KnowledgeBaseService,
     user_id: str,
     tenant_schema: str,
     category_id: str,
     db_session: AsyncSession
 ) -> None:
     """Validate that the user has access to upload to the specified category."""
-    # Check if category exists
-    category_exists = await kb_service.ensure_category_exists(
+    category_exists, has_access = await kb_service.validate_access(
+        user_id=user_id,
         category_id=category_id,
         tenant_schema=tenant_schema,
         db_session=db_session,
     )
     if not category_exists:
         raise HTTPException(status_code=404, detail="Category not found")
-
-    # Check user access to category
-    has_access = await kb_service.ensure_access_to_category(
-        user_id=user_id,
-        tenant_schema=tenant_schema,
-        category_id=category_id,
-        db_session=db_session,
-    )
     if not has_access:
         raise HTTPException(status_code=403, detail="Access denied to this category")
 
@@ -101,12 +115,8 @@ async def _handle_background_task_error(
     logger.error(f"Failed to queue background task for document {kb_id}: {str(error)}")
     
     try:
-        # Create appropriate model for the tenant
-        if tenant_schema != "public":
-            KnowledgeBaseModel = get_knowledge_base_model(tenant_schema)
-        else:
-            KnowledgeBaseModel = KnowledgeBase
-            
+        KnowledgeBaseModel = resolve_knowledge_base_model(tenant_schema)
+
         await db_session.execute(
             update(KnowledgeBaseModel)
             .where(KnowledgeBaseModel.id == kb_id)
@@ -118,20 +128,25 @@ async def _handle_background_task_error(
         raise HTTPException(status_code=500, detail="Failed to queue document processing")
 
 
-@router.get("/documents", response_model=List[KnowledgeBaseResponse], summary="Get User Documents")
+@router.get("/documents", responses={200: {"model": List[KnowledgeBaseResponse]}}, summary="Get User Documents")
 async def get_user_documents(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
     current_user: dict = Depends(get_current_user),
-    db_session: AsyncSession = Depends(get_db_tenant)
+    db_session: AsyncSession = Depends(get_db_tenant),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
-    """Retrieve all documents for the current user."""
+    """Retrieve a page of documents for the current user, newest first."""
     try:
         documents = await kb_service.get_user_documents(
             user_id=current_user["sub"],
             tenant_schema=current_user["tenant"],
             db_session=db_session,
+            skip=skip,
+            limit=limit,
         )
 
-        return [_create_knowledge_base_response(doc) for doc in documents]
+        return orjson_list_response(_create_knowledge_base_response(doc) for doc in documents)
     except Exception as e:
         logger.error(f"Error fetching documents: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch documents")
@@ -141,7 +156,8 @@ async def get_user_documents(
 async def get_document_status(
     document_id: str,
     current_user: dict = Depends(get_current_user),
-    db_session: AsyncSession = Depends(get_db_tenant)
+    db_session: AsyncSession = Depends(get_db_tenant),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
     """Get the processing status of a specific document."""
     try:
@@ -174,45 +190,52 @@ async def upload_document(
     category_id: str = Form(...),
     current_user: dict = Depends(get_current_user),
     db_session: AsyncSession = Depends(get_db_tenant),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
     """Upload a document for processing and vectorization."""
+    upload = None
     try:
         # Validate user access to category
         await _validate_document_access(
+            kb_service,
             user_id=current_user["sub"],
             tenant_schema=current_user["tenant"],
             category_id=category_id,
             db_session=db_session,
         )
 
+        # Stream the upload to a temp file; the processing task removes it when done
+        upload = await spool_upload(file)
+        logger.debug("Spooled upload %s: %d bytes", file.filename, upload.size)
+
         # Create knowledge base record
         kb_record = await kb_service.create_kb_record(
             user_id=current_user["sub"],
             file_name=file.filename,
             category_id=category_id,
             mime=file.content_type,
-            file_size=file.size,
+            file_size=upload.size,
             tenant_schema=current_user["tenant"],
             db_session=db_session,
+            file_hash=upload.sha256,
         )
 
-        # Read file content
-        file_content_bytes = await file.read()
-        logger.info(f"Read file content, size: {len(file_content_bytes)} bytes")
-        
         # Queue background processing task
         try:
-            background_tasks.add_task(
-                kb_service.process_document_background,
+            enqueue_document_processing(
+                background_tasks,
+                kb_service,
                 kb_record.id,
-                file_content_bytes,
+                upload.path,
                 file.content_type,
                 current_user["sub"],
                 category_id,
                 current_user["tenant"],
+                upload.sha256,
             )
-            logger.info(f"Successfully queued background task for document {kb_record.id}")
+            logger.debug("Queued processing for document %s", kb_record.id)
         except Exception as bg_error:
+            discard_upload(upload.path)
             await _handle_background_task_error(
                 kb_record.id,
                 current_user["tenant"],
@@ -229,15 +252,22 @@ async def upload_document(
         raise
     except Exception as e:
         await db_session.rollback()
+        if upload is not None:
+            discard_upload(upload.path)
         logger.error(f"Error uploading document: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to upload document")
 
 
-@router.post("/query", response_model=RAGQueryResponse, summary="Query KB")
+@router.post(
+    "/query",
+    responses={200: {"model": RAGQueryResponse}},
+    summary="Query KB",
+)
 async def query_kb(
     query_request: RAGQueryRequest,
     current_user: dict = Depends(get_current_user),
     db_session: AsyncSession = Depends(get_db_tenant),
+    rag_service: RAGService = Depends(get_rag_service),
 ):
     """Query the knowledge base for relevant documents."""
     try:
@@ -255,21 +285,24 @@ async def query_kb(
             accessible_categories,
             db_session,
             query_request.top_k,
-            current_user["tenant"]
+            current_user["tenant"],
+            include_embedding=query_request.include_embedding,
         )
 
         # Convert results to response format
         response_items = [
-            _create_vector_document_response(doc, score)
+            _create_vector_document_response(
+                doc, score, query_request.include_embedding, query_request.embedding_format
+            )
             for doc, score in search_results
         ]
 
-        return RAGQueryResponse(
+        return RAGQueryResponse.model_construct(
             query=query_request.query,
             results=response_items,
             total_results=len(response_items),
             processing_time_ms=0.0,
-        )
+        ).to_response(exclude_none=True)
     except HTTPException:
         raise
     except Exception as e:
@@ -277,16 +310,18 @@ async def query_kb(
         raise HTTPException(status_code=500, detail="Failed to query knowledge base")
 
 
-@router.post("/chat", response_model=RAGChatResponse, summary="Chat with KB")
+@router.post("/chat", responses={200: {"model": RAGChatResponse}}, summary="Chat with KB")
 async def chat_with_kb(
     chat_request: RAGChatRequest,
     current_user: dict = Depends(get_current_user),
     db_session: AsyncSession = Depends(get_db_tenant),
+    rag_service: RAGService = Depends(get_rag_service),
+    llm_service: LLMService = Depends(get_llm_service),
 ):
     """Chat with the knowledge base using RAG-powered responses."""
     try:
         # Set tenant search path
-        await db_session.execute(text(f'SET search_path TO "{current_user["tenant"]}"'))
+        await set_search_path(db_session, current_user["tenant"])
         
         # Get accessible categories
         accessible_categories = await rag_service.get_accessible_categories(
@@ -307,33 +342,22 @@ async def chat_with_kb(
 
         # Get or create default chat tab
         chat_service = ChatHistoryService(db_session)
-        tabs = await chat_service.list_chat_tabs(user_id=current_user["sub"])
-        
-        default_tab = next(
-            (tab for tab in tabs if getattr(tab, "name", None) == "KB Chat"),
-            None
-        )
-        
-        if default_tab is None:
-            default_tab = await chat_service.create_chat_tab(
-                name="KB Chat",
-                user_id=current_user["sub"]
-            )
+        default_tab_id = await chat_service.get_or_create_kb_tab(user_id=current_user["sub"])
 
         # Build conversation history context
-        history_context = await chat_service.build_history_context(default_tab.id)
+        history_context = await chat_service.build_history_context(default_tab_id)
 
         # Generate response using LLM
-        llm_service.model = chat_request.model
         answer = await llm_service.generate_response(
             chat_request.query,
             search_results,
-            history_context
+            history_context,
+            model=chat_request.model,
         )
 
         # Persist conversation turn
         await chat_service.append_message_to_tab(
-            default_tab.id,
+            default_tab_id,
             ChatHistoryCreate(
                 question=chat_request.query,
                 answer=answer,
@@ -344,13 +368,13 @@ async def chat_with_kb(
             ),
         )
 
-        return RAGChatResponse(
+        return RAGChatResponse.model_construct(
             query=chat_request.query,
             response=answer,
             sources=[doc.chunk_text for doc, _ in search_results],
             total_sources=len(search_results),
             processing_time_ms=0.0,
-        )
+        ).to_response()
     except HTTPException:
         raise
     except Exception as e:
@@ -358,31 +382,124 @@ async def chat_with_kb(
         raise HTTPException(status_code=500, detail="Failed to chat with knowledge base")
 
 
+@router.post("/chat/stream", summary="Chat with KB (streamed)")
+async def chat_with_kb_stream(
+    chat_request: RAGChatRequest,
+    current_user: dict = Depends(get_current_user),
+    db_session: AsyncSession = Depends(get_db_tenant),
+    rag_service: RAGService = Depends(get_rag_service),
+    llm_service: LLMService = Depends(get_llm_service),
+):
+    """
+    Streaming variant of /chat as Server-Sent Events.
+
+    Emits a `sources` event as soon as retrieval finishes, then `delta` events
+    while the LLM generates, and a final `done` event once the turn is saved.
+    """
+    start_time = time.perf_counter()
+    tenant = current_user["tenant"]
+    try:
+        await set_search_path(db_session, tenant)
+
+        accessible_categories = await rag_service.get_accessible_categories(
+            current_user["sub"], tenant, db_session
+        )
+        if not accessible_categories:
+            raise HTTPException(status_code=403, detail="No accessible categories")
+
+        search_results = await rag_service.search_similar_documents(
+            chat_request.query,
+            [],
+            accessible_categories,
+            db_session,
+            chat_request.top_k,
+            tenant
+        )
+
+        chat_service = ChatHistoryService(db_session)
+        default_tab_id = await chat_service.get_or_create_kb_tab(user_id=current_user["sub"])
+        history_context = await chat_service.build_history_context(default_tab_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in KB chat stream: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to chat with knowledge base")
+
+    sources = [doc.chunk_text for doc, _ in search_results]
+
+    async def event_stream():
+        yield sse_event({"sources": sources, "total_sources": len(sources)})
+
+        parts = []
+        async for delta in llm_service.stream_response(
+            chat_request.query,
+            search_results,
+            history_context,
+            model=chat_request.model,
+        ):
+            parts.append(delta)
+            yield sse_event({"delta": delta})
+
+        # The request session may already be released, so persist on a fresh one
+        try:
+            async with AsyncSessionLocal() as session:
+                await set_search_path(session, tenant)
+                await ChatHistoryService(session).append_message_to_tab(
+                    default_tab_id,
+                    ChatHistoryCreate(
+                        question=chat_request.query,
+                        answer="".join(parts),
+                        citation=None,
+                        latency=None,
+                        token_prompt=None,
+                        token_completion=None,
+                    ),
+                )
+        except Exception as e:
+            logger.error(f"Failed to save streamed KB chat turn: {str(e)}")
+
+        yield sse_event({"done": True, "processing_time_ms": (time.perf_counter() - start_time) * 1000})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/health", summary="KB Service Health Check")
 async def kb_health_check(
     current_user: dict = Depends(get_current_user),
     db_session: AsyncSession = Depends(get_db_tenant),
+    rag_service: RAGService = Depends(get_rag_service),
+    kb_service: KnowledgeBaseService = Depends(get_kb_service),
 ):
     """Health check endpoint to verify KB service and background task functionality."""
     try:
-        # Test database connection
-        await db_session.execute(text(f'SET search_path TO "{current_user["tenant"]}"'))
-        result = await db_session.execute(text("SELECT 1"))
-        db_ok = result.scalar() == 1
-        
-        # Test background task setup
-        bg_ok = await kb_service.validate_background_task_setup(current_user["tenant"])
-        
-        # Test RAG service
-        rag_ok = True
-        try:
-            accessible = await rag_service.get_accessible_categories(
-                current_user["sub"], current_user["tenant"], db_session
-            )
-            rag_ok = len(accessible) >= 0  # Just check if it doesn't throw an error
-        except Exception as e:
-            logger.error(f"RAG service health check failed: {str(e)}")
-            rag_ok = False
+        tenant = current_user["tenant"]
+        probes = {"database": False, "rag_service": False}
+
+        async def _probe_request_session() -> None:
+            # AsyncSession does not allow concurrent operations, so the probes
+            # sharing the request session run in order within one task
+            await set_search_path(db_session, tenant)
+            result = await db_session.execute(text("SELECT 1"))
+            probes["database"] = result.scalar() == 1
+            await rag_service.get_accessible_categories(current_user["sub"], tenant, db_session)
+            probes["rag_service"] = True
+
+        # The background-task probe uses its own session, so it overlaps with the above
+        session_result, bg_result = await asyncio.gather(
+            _probe_request_session(),
+            kb_service.validate_background_task_setup(tenant),
+            return_exceptions=True,
+        )
+
+        if isinstance(session_result, Exception):
+            logger.error(f"Database/RAG service health check failed: {str(session_result)}")
+        db_ok = probes["database"]
+        rag_ok = probes["rag_service"]
+        bg_ok = bg_result is True
         
         is_healthy = all([db_ok, bg_ok, rag_ok])
         
@@ -2,15 +2,18 @@ import logging
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text, and_, update
+from sqlalchemy import select, and_, update
+import time
 import uuid
 from datetime import datetime
-import PyPDF2
+from pypdf import PdfReader
 from docx import Document
 
 from api.db.database import get_unscoped_db_session, AsyncSessionLocal
+from api.db.tenant import get_db_tenant_translated, set_search_path
 from api.models.category import Category as DocumentCategory
 from api.models.knowledge_base import KnowledgeBase, KBStatus
+from api.schemas.base import list_adapter
 from api.schemas.rag_schemas import (
     DocumentCategoryCreate, DocumentCategoryUpdate, DocumentCategoryResponse,
     KnowledgeBaseCreate, KnowledgeBaseResponse,
@@ -19,31 +22,27 @@ from api.schemas.rag_schemas import (
 )
 from api.services.rag_service import RAGService
 from api.services.llm_service import LLMService
+from api.services.providers import get_llm_service, get_rag_service
 from api.middleware.jwt_middleware import get_current_user
+from api.utils.process_pool import run_in_process
+from api.utils.uploads import discard_upload, spool_upload
+from api.utils.acl_cache import invalidate_accessible_categories
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/rag", tags=["RAG System"])
 
-# Initialize services
-rag_service = RAGService(
-    embedding_model="google",  # Can be configured via environment
-    api_key=None  # Will be loaded from environment
-)
-
-llm_service = LLMService(model="openai")  # Default to OpenAI
-
 
 @router.post("/categories", response_model=DocumentCategoryResponse)
 async def create_category(
     category: DocumentCategoryCreate,
     current_user: dict = Depends(get_current_user),
-    db_session: AsyncSession = Depends(get_unscoped_db_session)
+    db_session: AsyncSession = Depends(get_db_tenant_translated)
 ):
     """Create a new category (tenant-scoped)."""
     try:
-        await db_session.execute(text(f'SET search_path TO "{current_user["tenant"]}"'))
-
+        # The session qualifies the blueprint table with the tenant schema via
+        # schema_translate_map, so no search_path or Table.schema changes are needed
         existing_category = await db_session.execute(
             select(DocumentCategory).where(DocumentCategory.name == category.name)
         )
@@ -54,11 +53,10 @@ async def create_category(
             id=str(uuid.uuid4()),
             name=category.name,
         )
-        db_category.__table__.schema = current_user["tenant"]
 
         db_session.add(db_category)
         await db_session.commit()
-        await db_session.refresh(db_category)
+        invalidate_accessible_categories(current_user["tenant"])
 
         return DocumentCategoryResponse.model_validate(db_category)
     except Exception as e:
@@ -70,7 +68,8 @@ async def create_category(
 @router.get("/categories", response_model=List[DocumentCategoryResponse])
 async def get_categories(
     current_user: dict = Depends(get_current_user),
-    db_session: AsyncSession = Depends(get_unscoped_db_session)
+    db_session: AsyncSession = Depends(get_unscoped_db_session),
+    rag_service: RAGService = Depends(get_rag_service),
 ):
     """Get all categories accessible to the current user (via user-category association)."""
     try:
@@ -79,19 +78,21 @@ async def get_categories(
         )
         
         # Set the search path to the tenant's schema
-        await db_session.execute(text(f'SET search_path TO "{current_user["tenant"]}"'))
+        await set_search_path(db_session, current_user["tenant"])
         
-        # Fetch category details
-        categories = []
-        for category_id in accessible_categories:
-            result = await db_session.execute(
-                select(DocumentCategory).where(DocumentCategory.id == category_id)
-            )
-            category = result.scalar_one_or_none()
-            if category:
-                categories.append(DocumentCategoryResponse.model_validate(category))
-        
-        return categories
+        if not accessible_categories:
+            return []
+
+        # Fetch category details in one round-trip; the access set is unordered,
+        # so order by name for a stable response
+        result = await db_session.execute(
+            select(DocumentCategory)
+            .where(DocumentCategory.id.in_(list(accessible_categories)))
+            .order_by(DocumentCategory.name)
+        )
+        return list_adapter(DocumentCategoryResponse).validate_python(
+            result.scalars().all(), from_attributes=True
+        )
         
     except Exception as e:
         logger.error(f"Error fetching categories: {str(e)}")
@@ -104,70 +105,53 @@ async def upload_document(
     file: UploadFile = File(...),
     category_id: str = Form(...),
     current_user: dict = Depends(get_current_user),
-    db_session: AsyncSession = Depends(get_unscoped_db_session)
+    db_session: AsyncSession = Depends(get_unscoped_db_session),
+    rag_service: RAGService = Depends(get_rag_service),
 ):
     """Upload and process a document."""
+    upload = None
     try:
-        logger.info("=== STARTING DOCUMENT UPLOAD ===")
-        
+        logger.debug(
+            "User %s uploading %s to category %s in tenant %s",
+            current_user["sub"], file.filename, category_id, current_user["tenant"],
+        )
+
         # Validate category access
-        user_roles = [current_user["role"]]
-        logger.info(f"User {current_user['sub']} with roles {user_roles} trying to upload to category {category_id}")
-        logger.info(f"Tenant schema: {current_user['tenant']}")
-        
-        # Debug: Check what categories exist before calling the service
-        logger.info("Setting search path to tenant schema...")
-        await db_session.execute(text(f'SET search_path TO "{current_user["tenant"]}"'))
-        logger.info("Search path set successfully")
-        
-        logger.info("Executing direct query for categories...")
-        debug_result = await db_session.execute(select(DocumentCategory))
-        debug_categories = debug_result.scalars().all()
-        logger.info(f"Direct query found {len(debug_categories)} categories: {[c.name for c in debug_categories]}")
-        
-        logger.info("Calling RAG service to get accessible categories...")
+        await set_search_path(db_session, current_user["tenant"])
         accessible_categories = await rag_service.get_accessible_categories(
-            user_roles, current_user["tenant"], db_session
+            current_user["sub"], current_user["tenant"], db_session
         )
-        
-        logger.info(f"RAG service returned accessible categories: {accessible_categories}")
-        
         if category_id not in accessible_categories:
-            logger.error(f"Category {category_id} not found in accessible categories: {accessible_categories}")
             raise HTTPException(status_code=403, detail="Access denied to this category")
         
+        # Stream the upload to a temp file; the background task removes it when done
+        upload = await spool_upload(file)
+
         # Create knowledge base entry
-        logger.info("Creating knowledge base entry...")
         knowledge_base = KnowledgeBase(
             id=str(uuid.uuid4()),
             user_id=current_user["sub"],
             file_name=file.filename,
             category_id=category_id,
             mime=file.content_type,
-            file_size=file.size,
+            file_size=upload.size,
+            file_hash=upload.sha256,
             status=KBStatus.UPLOADED
         )
-        
-        logger.info(f"Knowledge base object created: {knowledge_base.id}")
         db_session.add(knowledge_base)
-        
-        logger.info("Committing to database...")
         await db_session.commit()
-        await db_session.refresh(knowledge_base)
-        logger.info("Knowledge base entry created successfully!")
-        
-        # Read file content before passing to background task
-        file_content_bytes = await file.read()
         
         # Add background task for document processing
         background_tasks.add_task(
             process_document_background,
+            rag_service,
             knowledge_base.id,
-            file_content_bytes,  # Pass bytes instead of file object
+            upload.path,  # Pass the spooled file path instead of the file object
             file.content_type,
             current_user["sub"],
             category_id,
-            current_user["tenant"]  # Pass tenant schema
+            current_user["tenant"],  # Pass tenant schema
+            upload.sha256
         )
         
         return DocumentUploadResponse(
@@ -176,36 +160,61 @@ async def upload_document(
             message="Document uploaded successfully. Processing started in background."
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         await db_session.rollback()
+        if upload is not None:
+            discard_upload(upload.path)
         logger.error(f"Error uploading document: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to upload document")
 
 
 async def process_document_background(
+    rag_service: RAGService,
     knowledge_base_id: str,
-    file_content,
+    file_path: str,
     mime_type: str,
     user_id: str,
     category_id: str,
-    tenant_schema: str
+    tenant_schema: str,
+    file_hash: Optional[str] = None
 ):
     """Background task for processing uploaded documents."""
     try:
-        # Update status to processing
         async with AsyncSessionLocal() as db_session:
             # Set search path to the tenant schema
-            await db_session.execute(text(f'SET search_path TO "{tenant_schema}"'))
+            await set_search_path(db_session, tenant_schema)
             logger.info(f"Processing document {knowledge_base_id} in background for tenant {tenant_schema}")
             
-            # Update knowledge base status
-            result = await db_session.execute(
-                update(KnowledgeBase).where(KnowledgeBase.id == knowledge_base_id).values(status=KBStatus.INGESTING)
-            )
-            await db_session.commit()
+            # No intermediate INGESTING write: consumers only act on the final
+            # COMPLETED/FAILED status, so each document costs a single status update
+
+            # Same content already processed: copy its vectors instead of re-embedding
+            if file_hash:
+                duplicate = await db_session.execute(
+                    select(KnowledgeBase.id).where(
+                        and_(
+                            KnowledgeBase.file_hash == file_hash,
+                            KnowledgeBase.status == KBStatus.COMPLETED,
+                            KnowledgeBase.id != knowledge_base_id,
+                        )
+                    ).limit(1)
+                )
+                source_id = duplicate.scalar_one_or_none()
+                if source_id:
+                    stored_count = await rag_service.copy_vectors_from_file(
+                        source_id, knowledge_base_id, user_id, category_id, db_session
+                    )
+                    await db_session.execute(
+                        update(KnowledgeBase).where(KnowledgeBase.id == knowledge_base_id).values(status=KBStatus.COMPLETED)
+                    )
+                    await db_session.commit()
+                    logger.info(f"Document {knowledge_base_id} reused {stored_count} chunks from {source_id}.")
+                    return
             
-            # Extract text from file
-            text_content = await extract_text_from_file(file_content, mime_type)
+            # Extract text from file in the process pool to keep the event loop free
+            text_content = await run_in_process(extract_text_from_file, file_path, mime_type)
             
             # Get file metadata
             metadata = {
@@ -215,12 +224,12 @@ async def process_document_background(
             
             # Process document with RAG service
             vector_docs = await rag_service.process_document(
-                knowledge_base_id, text_content, category_id, metadata, db_session
+                knowledge_base_id, text_content, category_id, metadata, db_session, tenant_schema
             )
             
             # Store vector documents
             stored_count = await rag_service.store_vector_documents(
-                vector_docs, user_id, category_id, db_session
+                vector_docs, user_id, category_id, db_session, tenant_schema
             )
             
             # Update knowledge base status
@@ -242,6 +251,8 @@ async def process_document_background(
                 await db_session.commit()
         except Exception as update_error:
             logger.error(f"Failed to update document status: {str(update_error)}")
+    finally:
+        discard_upload(file_path)
 
 
 @router.get("/documents/{document_id}/status", response_model=DocumentProcessingStatus)
@@ -253,7 +264,7 @@ async def get_document_status(
     """Get the processing status of a document."""
     try:
         # Set the search path to the tenant's schema
-        await db_session.execute(text(f'SET search_path TO "{current_user["tenant"]}"'))
+        await set_search_path(db_session, current_user["tenant"])
         
         result = await db_session.execute(
             select(KnowledgeBase).where(
@@ -276,22 +287,23 @@ async def get_document_status(
         raise HTTPException(status_code=500, detail="Failed to fetch document status")
 
 
-@router.post("/query", response_model=RAGQueryResponse)
+@router.post("/query", responses={200: {"model": RAGQueryResponse}})
 async def query_rag(
     query_request: RAGQueryRequest,
     current_user: dict = Depends(get_current_user),
-    db_session: AsyncSession = Depends(get_unscoped_db_session)
+    db_session: AsyncSession = Depends(get_unscoped_db_session),
+    rag_service: RAGService = Depends(get_rag_service),
 ):
     """Query the RAG system for relevant documents."""
     try:
-        start_time = datetime.utcnow()
+        start_time = time.perf_counter()
         
         # Get user roles
         user_roles = [current_user["role"]]
         
         # Get accessible categories
         accessible_categories = await rag_service.get_accessible_categories(
-            user_roles, current_user["tenant"], db_session
+            current_user["sub"], current_user["tenant"], db_session
         )
         
         if not accessible_categories:
@@ -308,54 +320,55 @@ async def query_rag(
         )
         
         # Calculate processing time
-        end_time = datetime.utcnow()
-        processing_time = (end_time - start_time).total_seconds() * 1000
+        processing_time = (time.perf_counter() - start_time) * 1000.0
         
-        # Convert results to response format
-        results = []
-        for doc, similarity in search_results:
-            results.append(VectorDocumentResponse(
+        # Convert results to response format; embeddings are not returned
+        results = [
+            VectorDocumentResponse.model_construct(
                 id=doc.id,
                 user_id=doc.user_id,
                 category_id=doc.category_id,
                 file_id=doc.file_id,
                 chunk_id=doc.chunk_id,
                 chunk_text=doc.chunk_text,
-                chunk_hash=doc.chunk_hash,
-                embedding=doc.embedding,
-                doc_metadata=doc.doc_metadata,
+                embedding=None,
+                doc_metadata=doc.doc_metadata or {},
                 created_at=doc.created_at,
                 updated_at=doc.updated_at
-            ))
+            )
+            for doc, similarity in search_results
+        ]
         
-        return RAGQueryResponse(
+        return RAGQueryResponse.model_construct(
             query=query_request.query,
             results=results,
             total_results=len(results),
             processing_time_ms=processing_time
-        )
+        ).to_response(exclude_none=True)
         
     except Exception as e:
         logger.error(f"Error querying RAG system: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to query RAG system")
 
 
-@router.post("/chat", response_model=RAGChatResponse)
+@router.post("/chat", responses={200: {"model": RAGChatResponse}})
 async def chat_with_rag(
     chat_request: RAGChatRequest,
     current_user: dict = Depends(get_current_user),
-    db_session: AsyncSession = Depends(get_unscoped_db_session)
+    db_session: AsyncSession = Depends(get_unscoped_db_session),
+    rag_service: RAGService = Depends(get_rag_service),
+    llm_service: LLMService = Depends(get_llm_service),
 ):
     """Chat with the RAG system - combines retrieval and generation."""
     try:
-        start_time = datetime.utcnow()
+        start_time = time.perf_counter()
         
         # Get user roles
         user_roles = [current_user["role"]]
         
         # Get accessible categories
         accessible_categories = await rag_service.get_accessible_categories(
-            user_roles, current_user["tenant"], db_session
+            current_user["sub"], current_user["tenant"], db_session
         )
         
         if not accessible_categories:
@@ -372,23 +385,22 @@ async def chat_with_rag(
         )
         
         # Generate response using LLM
-        llm_service.model = chat_request.model  # Set the requested model
         response = await llm_service.generate_response(
             chat_request.query,
-            search_results
+            search_results,
+            model=chat_request.model,
         )
         
         # Calculate processing time
-        end_time = datetime.utcnow()
-        processing_time = (end_time - start_time).total_seconds() * 1000
+        processing_time = (time.perf_counter() - start_time) * 1000.0
         
-        return RAGChatResponse(
+        return RAGChatResponse.model_construct(
             query=chat_request.query,
             response=response,
             sources=[doc.chunk_text for doc, _ in search_results],
             total_sources=len(search_results),
             processing_time_ms=processing_time
-        )
+        ).to_response()
         
     except Exception as e:
         logger.error(f"Error in RAG chat: {str(e)}")
@@ -403,7 +415,7 @@ async def get_user_documents(
     """Get all documents uploaded by the current user."""
     try:
         # Set the search path to the tenant's schema
-        await db_session.execute(text(f'SET search_path TO "{current_user["tenant"]}"'))
+        await set_search_path(db_session, current_user["tenant"])
         
         result = await db_session.execute(
             select(KnowledgeBase).where(KnowledgeBase.user_id == current_user['sub']).order_by(KnowledgeBase.created_at.desc())
@@ -419,7 +431,7 @@ async def get_user_documents(
                 mime=doc.mime,
                 file_size=doc.file_size,
                 status=doc.status,
-                json=doc.json,
+                json_data=doc.json,
                 s3_url=doc.s3_url,
                 created_at=doc.created_at,
                 updated_at=doc.updated_at
@@ -432,30 +444,28 @@ async def get_user_documents(
         raise HTTPException(status_code=500, detail="Failed to fetch user documents")
 
 
-async def extract_text_from_file(file_content, mime_type: str) -> str:
-    """Extract text content from uploaded file based on MIME type."""
+def extract_text_from_file(file_path: str, mime_type: str) -> str:
+    """Extract text content from uploaded file based on MIME type.
+
+    CPU-bound; callers run it in the process pool via run_in_process.
+    """
     try:
         if mime_type == "application/pdf":
-            # Handle PDF files - file_content is now bytes
-            import io
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+            # Handle PDF files - read straight from the spooled upload
+            pdf_reader = PdfReader(file_path)
+            parts = [page.extract_text() or "" for page in pdf_reader.pages]
+            return "\n".join(parts).strip()
         
         elif mime_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            # Handle DOCX files - file_content is now bytes
-            import io
-            doc = Document(io.BytesIO(file_content))
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text.strip()
+            # Handle DOCX files - read straight from the spooled upload
+            doc = Document(file_path)
+            parts = [paragraph.text for paragraph in doc.paragraphs]
+            return "\n".join(parts).strip()
         
         elif mime_type.startswith("text/"):
-            # Handle text files - file_content is now bytes
-            return file_content.decode('utf-8')
+            # Handle text files
+            with open(file_path, "r", encoding="utf-8") as f:
+                return f.read()
         
         else:
             # For unsupported file types, return a placeholder
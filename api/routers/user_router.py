@@ -6,6 +6,7 @@ from api.db.tenant import get_db_public, get_db_tenant
 from api.schemas.user import UserCreate, UserUpdate, UserRead
 from api.services.user_service import UserService
 from api.middleware.jwt_middleware import get_current_user
+from api.utils.session_cache import cache_session, get_cached_session
 
 # Initialize the router with a prefix and tags for API documentation
 router = APIRouter(prefix="/api/users", tags=["Users"], dependencies=[Depends(get_current_user)])
@@ -31,8 +32,13 @@ async def get_current_user_detail(
     current_user: dict = Depends(get_current_user)
 ):
     """Get the currently authenticated user."""
+    cached = await get_cached_session(current_user["tenant"], current_user["sub"])
+    if cached is not None:
+        return cached
     user_service = UserService(db)
-    return await user_service.get_user_by_email(email=current_user["email"])
+    user = await user_service.get_user_by_email(email=current_user["email"])
+    await cache_session(current_user["tenant"], current_user["sub"], user)
+    return user
 
 @router.get("/{user_id}", response_model=UserRead, summary="Get user by ID")
 async def get_user(
@@ -0,0 +1,54 @@
+# api/schemas/base.py
+from functools import lru_cache
+from typing import Iterable
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+
+from api.config import FAST_ORM_SERIALIZATION
+
+
+class ORJSONModel(BaseModel):
+    """
+    Base for read/response schemas.
+
+    Hot endpoints build the model once and return `to_response()`, which skips
+    FastAPI's response_model re-validation and jsonable_encoder pass. Instances are
+    output-only DTOs, so they are frozen and reject unknown fields.
+    """
+    model_config = ConfigDict(from_attributes=True, frozen=True, extra="forbid")
+
+    @classmethod
+    def from_orm_fast(cls, obj):
+        """
+        Build from a trusted ORM row without running validation; the database already
+        enforces the column types. Never use on client input. Falls back to
+        model_validate when FAST_ORM_SERIALIZATION is off.
+        """
+        if not FAST_ORM_SERIALIZATION:
+            return cls.model_validate(obj)
+        return cls.model_construct(**{name: getattr(obj, name) for name in cls.model_fields})
+
+    def to_response(self, status_code: int = 200, exclude_none: bool = False) -> ORJSONResponse:
+        # mode="json" turns datetime/enum/UUID into primitives orjson always accepts
+        return ORJSONResponse(
+            content=self.model_dump(mode="json", by_alias=True, exclude_none=exclude_none),
+            status_code=status_code,
+        )
+
+
+def orjson_list_response(items: Iterable[ORJSONModel], status_code: int = 200) -> ORJSONResponse:
+    """Serialize a list of response models in one pass, bypassing response_model validation."""
+    return ORJSONResponse(
+        content=[item.model_dump(mode="json", by_alias=True) for item in items],
+        status_code=status_code,
+    )
+
+
+@lru_cache(maxsize=128)
+def list_adapter(model: type) -> TypeAdapter:
+    """
+    Cached TypeAdapter for list[model]. Building an adapter compiles a validator,
+    so validate whole batches through one shared instance instead of per row.
+    """
+    return TypeAdapter(list[model])
@@ -1,26 +1,35 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, Any, List
+from typing import Optional, Any, List, Literal
+from typing_extensions import TypedDict
+
+from api.schemas.base import ORJSONModel
+
+# Models LLMService can build; anything else is rejected before reaching the handler
+LLMModel = Literal["openai", "google"]
+
+
+# Closed shape for citations so pydantic builds a keyed validator instead of walking
+# an arbitrary dict; unknown keys are dropped on input
+class CitationDict(TypedDict, total=False):
+    source: str
+    page: int
+    url: str
 
 # --- Schema for Reading Data ---
 # This defines the shape of a chat history record when you send it from your API.
-class ChatHistoryRead(BaseModel):
+# ORJSONModel enables from_attributes, so it can be built from the ChatHistory row.
+class ChatHistoryRead(ORJSONModel):
     id: str
     question: str
     answer: str
-    citation: Optional[dict] = None
+    citation: Optional[CitationDict] = None
     latency: Optional[int] = None
     token_prompt: Optional[int] = None
     token_completion: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
-    # This config allows Pydantic to create this schema directly from
-    # the SQLAlchemy ChatHistory model object.
-    model_config = {
-        "from_attributes": True
-    }
-
 
 # --- Schema for Creating Data ---
 # This defines the shape of the data your API expects when a client
@@ -28,33 +37,45 @@ class ChatHistoryRead(BaseModel):
 class ChatHistoryCreate(BaseModel):
     question: str = Field(..., min_length=1)
     answer: str = Field(..., min_length=1)
-    citation: Optional[dict] = None
+    citation: Optional[CitationDict] = None
     latency: Optional[int] = None
     token_prompt: Optional[int] = None
     token_completion: Optional[int] = None
 
 
+# --- Columnar page of chat history ---
+# Struct-of-arrays variant of List[ChatHistoryRead] for long histories. Numeric columns
+# are base64 of packed little-endian arrays: int32 with -1 for null, created_at as
+# int64 epoch milliseconds. Decode with e.g. numpy.frombuffer(base64.b64decode(v), "<i4").
+class ChatHistoryPage(ORJSONModel):
+    ids: List[str]
+    questions: List[str]
+    answers: List[str]
+    latencies: str
+    tokens_prompt: str
+    tokens_completion: str
+    created_at: str
+
+
 # --- Schemas for Chat Tabs (sessions) ---
 class ChatTabCreate(BaseModel):
     name: str = Field(..., min_length=1)
 
 
-class ChatTabRead(BaseModel):
+class ChatTabRead(ORJSONModel):
     id: str
     user_id: str
     name: str
 
-    model_config = {"from_attributes": True}
-
 
 # --- Schemas for sending chat messages with RAG ---
 class ChatSendRequest(BaseModel):
     query: str = Field(..., min_length=1)
     top_k: int = Field(default=5, ge=1, le=20)
-    model: str = Field(default="openai", description="LLM model to use: 'openai' or 'google'")
+    model: LLMModel = Field(default="openai", description="LLM model to use: 'openai' or 'google'")
 
 
-class ChatSendResponse(BaseModel):
+class ChatSendResponse(ORJSONModel):
     message: ChatHistoryRead
     sources: List[str] = []
     total_sources: int
@@ -66,10 +87,10 @@ class ChatInitiateRequest(BaseModel):
     query: str = Field(..., min_length=1, description="The first message to send in the new chat")
     tab_name: Optional[str] = Field(None, description="Optional name for the chat tab. If not provided, will be auto-generated from the query")
     top_k: int = Field(default=5, ge=1, le=20)
-    model: str = Field(default="openai", description="LLM model to use: 'openai' or 'google'")
+    model: LLMModel = Field(default="openai", description="LLM model to use: 'openai' or 'google'")
 
 
-class ChatInitiateResponse(BaseModel):
+class ChatInitiateResponse(ORJSONModel):
     tab: ChatTabRead
     message: ChatHistoryRead
     sources: List[str] = []
@@ -1,7 +1,16 @@
 # api/schemas/organization.py
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from datetime import datetime
 
+from api.models.organization import OrgStatus, RagType
+from api.models.user import UserRole
+
+from api.schemas.base import ORJSONModel
+
+# Built once at import; validators only do a set lookup per request
+_VALID_STATUSES = frozenset(s.value for s in OrgStatus)
+_VALID_RAG_TYPES = frozenset(r.value for r in RagType)
+
 class OrgSignupRequest(BaseModel):
     email: EmailStr
     name: str
@@ -21,7 +30,23 @@ class CreateOrganizationRequest(BaseModel):
     status: str = "ACTIVE"
     rag_type: str = "BASIC"
 
-class OrganizationOut(BaseModel):
+    @field_validator("status", mode="before")
+    @classmethod
+    def normalize_status(cls, v):
+        v = str(v).upper()
+        if v not in _VALID_STATUSES:
+            raise ValueError(f"status must be one of {sorted(_VALID_STATUSES)}")
+        return v
+
+    @field_validator("rag_type", mode="before")
+    @classmethod
+    def normalize_rag_type(cls, v):
+        v = str(v).upper()
+        if v not in _VALID_RAG_TYPES:
+            raise ValueError(f"rag_type must be one of {sorted(_VALID_RAG_TYPES)}")
+        return v
+
+class OrganizationOut(ORJSONModel):
     id: str
     email: str
     name: str
@@ -31,6 +56,29 @@ class OrganizationOut(BaseModel):
     updated_at: datetime
     status: str
     rag_type: str
-    
-    class Config:
-        from_attributes = True
\ No newline at end of file
+
+
+# --- create_organization_with_owner response ---
+# Only the fields the onboarding response exposes; built from the ORM rows with
+# from_orm_fast and dumped once, so enums and datetimes serialize in pydantic-core.
+class OrganizationCreated(ORJSONModel):
+    id: str
+    email: str
+    name: str
+    subdomain: str
+    status: OrgStatus
+    rag_type: RagType
+    created_at: datetime
+
+class OwnerCreated(ORJSONModel):
+    id: str
+    name: str
+    email: str
+    role: UserRole
+    is_owner: bool
+    created_at: datetime
+
+class OrganizationOwnerCreatedResponse(ORJSONModel):
+    organization: OrganizationCreated
+    owner: OwnerCreated
+    token: str
@@ -1,7 +1,11 @@
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing_extensions import TypedDict
 from api.models.knowledge_base import KBStatus
+from api.schemas.base import ORJSONModel
+from api.schemas.chat_history import LLMModel
+from api.utils.embedding_codec import decode_embedding_b64
 
 
 class DocumentCategoryBase(BaseModel):
@@ -22,14 +26,11 @@ class DocumentCategoryUpdate(BaseModel):
     is_general: Optional[bool] = None
 
 
-class DocumentCategoryResponse(DocumentCategoryBase):
+class DocumentCategoryResponse(DocumentCategoryBase, ORJSONModel):
     id: str
     organization_id: str
     created_at: datetime
     updated_at: datetime
-    
-    class Config:
-        from_attributes = True
 
 
 class KnowledgeBaseBase(BaseModel):
@@ -44,45 +45,66 @@ class KnowledgeBaseCreate(KnowledgeBaseBase):
 
 
 class KnowledgeBaseUpdate(BaseModel):
+    # `json` on the wire; the attribute name keeps BaseModel.json() unshadowed
+    model_config = ConfigDict(populate_by_name=True)
+
     status: Optional[KBStatus] = None
-    json: Optional[str] = None
+    json_data: Optional[str] = Field(None, alias="json")
     s3_url: Optional[str] = None
 
 
-class KnowledgeBaseResponse(KnowledgeBaseBase):
+class KnowledgeBaseResponse(KnowledgeBaseBase, ORJSONModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     id: str
     user_id: str
     status: KBStatus
-    json: Optional[str] = None
+    json_data: Optional[str] = Field(None, alias="json")
     s3_url: Optional[str] = None
     created_at: datetime
     updated_at: datetime
-    
-    class Config:
-        from_attributes = True
+
+
+class VectorMetadata(TypedDict, total=False):
+    """Per-chunk metadata written by RAGService.process_document."""
+    file_type: str
+    processing_timestamp: str
+    chunk_index: int
+    total_chunks: int
+    chunk_size: int
+    processed_at: str
 
 
 class VectorDocumentBase(BaseModel):
+    # `metadata` on the wire; doc_metadata matches the ORM column and avoids the
+    # clash with SQLAlchemy's declarative `metadata`
+    model_config = ConfigDict(populate_by_name=True)
+
     category_id: str
     file_id: str
     chunk_id: int = Field(..., ge=0)
     chunk_text: str
-    metadata: Dict[str, Any] = Field(default_factory=dict)
+    doc_metadata: VectorMetadata = Field(default_factory=dict, alias="metadata")
 
 
 class VectorDocumentCreate(VectorDocumentBase):
-    embedding: List[float]  # Input embeddings as list
+    embedding: List[float]  # Input embeddings as list, or base64 big-endian float32
+
+    @field_validator("embedding", mode="before")
+    @classmethod
+    def decode_base64_embedding(cls, v):
+        if isinstance(v, (str, bytes)):
+            return decode_embedding_b64(v).tolist()
+        return v
 
 
-class VectorDocumentResponse(VectorDocumentBase):
+class VectorDocumentResponse(VectorDocumentBase, ORJSONModel):
     id: str
     user_id: str
-    embedding: List[float]
+    embedding: Optional[List[float]] = None  # Only populated when explicitly requested
+    embedding_b64: Optional[str] = None  # Base64 big-endian float32, for embedding_format="base64"
     created_at: datetime
     updated_at: datetime
-    
-    class Config:
-        from_attributes = True
 
 
 class DocumentUploadRequest(BaseModel):
@@ -102,9 +124,12 @@ class RAGQueryRequest(BaseModel):
     query: str = Field(..., min_length=1)
     top_k: int = Field(default=5, ge=1, le=20)
     include_metadata: bool = True
+    include_embedding: bool = False
+    # "base64" returns embedding_b64 instead of a JSON float array (about 4x smaller)
+    embedding_format: Literal["float", "base64"] = "float"
 
 
-class RAGQueryResponse(BaseModel):
+class RAGQueryResponse(ORJSONModel):
     query: str
     results: List[VectorDocumentResponse]
     total_results: int
@@ -122,9 +147,9 @@ class DocumentProcessingStatus(BaseModel):
 class RAGChatRequest(BaseModel):
     query: str = Field(..., min_length=1)
     top_k: int = Field(default=5, ge=1, le=20)
-    model: str = Field(default="openai", description="LLM model to use: 'openai' or 'google'")
+    model: LLMModel = Field(default="openai", description="LLM model to use: 'openai' or 'google'")
 
-class RAGChatResponse(BaseModel):
+class RAGChatResponse(ORJSONModel):
     query: str
     response: str
     sources: List[str]
@@ -1,33 +1,34 @@
-from pydantic import BaseModel, Field
+import re
+from pydantic import AfterValidator, BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, Optional
+
+from api.schemas.base import ORJSONModel
+
+# Compiled once and shared by every schema that accepts a subdomain
+_SUBDOMAIN_RE = re.compile(r"^[a-z0-9]+(?:-[a-z0-9]+)*$")
+
+
+def _check_subdomain(v: str) -> str:
+    if not _SUBDOMAIN_RE.match(v):
+        raise ValueError("Subdomain may only contain lowercase letters, digits and single hyphens")
+    return v
+
+
+Subdomain = Annotated[str, Field(min_length=3, max_length=100), AfterValidator(_check_subdomain)]
+
 
 class ReservedSubdomainBase(BaseModel):
-    subdomain: str = Field(
-        ..., 
-        min_length=3, 
-        max_length=100, 
-        pattern=r"^[a-z0-9]+(?:-[a-z0-9]+)*$",
-        examples=["api", "docs-v2"]
-    )
+    subdomain: Subdomain = Field(..., examples=["api", "docs-v2"])
     description: Optional[str] = Field(None, max_length=500, examples=["Reserved for the main API endpoint."])
 
 class ReservedSubdomainCreate(ReservedSubdomainBase):
     pass
 
 class ReservedSubdomainUpdate(BaseModel):
-    subdomain: Optional[str] = Field(
-        None, 
-        min_length=3, 
-        max_length=100, 
-        pattern=r"^[a-z0-9]+(?:-[a-z0-9]+)*$"
-    )
+    subdomain: Optional[Subdomain] = None
     description: Optional[str] = Field(None, max_length=500)
 
-class ReservedSubdomainRead(ReservedSubdomainBase):
+class ReservedSubdomainRead(ReservedSubdomainBase, ORJSONModel):
     id: str
-    created_at: datetime
-
-    model_config = {
-        "from_attributes": True
-    }
\ No newline at end of file
+    created_at: datetime
\ No newline at end of file
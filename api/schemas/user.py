@@ -1,8 +1,8 @@
-import enum
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from typing import Optional, List
 from api.models.user import UserRole # Import the role enum
+from api.schemas.base import ORJSONModel
 
 class UserBase(BaseModel):
     """Base schema for user data."""
@@ -23,14 +23,10 @@ class UserUpdate(BaseModel):
     password: Optional[str] = Field(None, min_length=8, examples=["newpassword123"])
     category_ids: Optional[List[str]] = Field(None, examples=[["cat1", "cat2"]], description="List of category IDs to associate with the user")
 
-class UserRead(UserBase):
+class UserRead(UserBase, ORJSONModel):
     """Schema for reading user data. Excludes sensitive info like password."""
     id: str
     is_owner: bool
     created_at: datetime
     updated_at: datetime
-    categories: List[dict] = Field(default=[], description="Associated categories")
-
-    model_config = {
-        "from_attributes": True  # Enables creating the schema from an ORM model
-    }
\ No newline at end of file
+    categories: List[dict] = Field(default=[], description="Associated categories")
\ No newline at end of file
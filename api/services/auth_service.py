@@ -1,57 +1,154 @@
 # api/services/auth_service.py
+import asyncio
 import datetime
-import random
+import hmac
+import logging
+import uuid
 from fastapi import HTTPException, status
-from sqlalchemy import select, text
+from sqlalchemy import delete, exists, literal, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 import secrets
-from api.db.database import Base
 # Import the Enum types along with the model
 from api.models.organization import Organization, OrgStatus, RagType
 from api.models.otp import OTP
 from api.models.reserved_subdomain import ReservedSubdomain
 from api.models.user import UserRole, get_user_model, User as UserBlueprint
-from api.schemas.organization import CreateOrganizationRequest
+from api.schemas.organization import (
+    CreateOrganizationRequest,
+    OrganizationCreated,
+    OrganizationOwnerCreatedResponse,
+    OwnerCreated,
+)
+from api.services.onboarding_service import claim_pooled_schema, replenish_schema_pool, tenant_metadata
 from api.services.user_service import UserService
 from api.utils.email_sender import send_email
-from api.utils.security import hash_password, verify_password, create_jwt_token
+from api.utils.otp_store import (
+    OTP_MAX_ATTEMPTS,
+    delete_otp,
+    failed_attempts,
+    get_otp,
+    otp_store_enabled,
+    record_failed_attempt,
+    store_otp,
+)
+from api.utils.session_cache import cache_session, drop_session
+from api.utils.security import hash_password_async, verify_and_update_password_async, create_jwt_token
+from api.utils.response import static_response, static_response_body
 from api.utils.util_response import APIResponse
 from api.db.tenant import tenant_schema
-from api.utils.TenantUtils import TenantUtils
+
+logger = logging.getLogger(__name__)
+
+# Strong references to fire-and-forget tasks so they are not garbage-collected mid-flight
+_background_tasks: set = set()
+
+
+def _spawn_background(coro, description: str) -> None:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+
+    def _done(t: asyncio.Task) -> None:
+        _background_tasks.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logger.error(f"Background task failed ({description}): {str(t.exception())}")
+
+    task.add_done_callback(_done)
+
+
+# Constant success bodies, serialized once
+_OTP_SENT_BODY = static_response_body("OTP sent to email")
+_OTP_VERIFIED_BODY = static_response_body("OTP verified successfully")
+_LOGOUT_BODY = static_response_body("Logout successful")
+
 
 class AuthService:
     def __init__(self, session: AsyncSession):
         self.session = session
 
     async def signup(self, email: str):
-        otp_code = random.randint(100000, 999999)
-        expires_at = datetime.datetime.now() + datetime.timedelta(minutes=5)
-        org = await self.session.execute(select(Organization).where(Organization.email == email))
-        if org.scalar_one_or_none():
-            raise HTTPException(status_code=400, detail="Organization already exists with this email")
-        otp_entry = await self.session.execute(select(OTP).where(OTP.email == email))
-        otp_entry = otp_entry.scalar_one_or_none()
-        if otp_entry:
-            otp_entry.otp = otp_code
-            otp_entry.expires_at = expires_at
+        otp_code = secrets.randbelow(900_000) + 100_000
+        if otp_store_enabled():
+            org_taken = await self.session.scalar(select(exists().where(Organization.email == email)))
+            if org_taken:
+                raise HTTPException(status_code=400, detail="Organization already exists with this email")
+            await store_otp(email, otp_code)
         else:
-            otp_entry = OTP(email=email, otp=otp_code, expires_at=expires_at)
-            self.session.add(otp_entry)
+            await self._upsert_otp_row(email, otp_code)
+
+        # Don't hold the request open for the SMTP exchange
+        _spawn_background(send_email(email, otp_code), f"OTP email to {email}")
+        return static_response(_OTP_SENT_BODY)
+
+    async def _upsert_otp_row(self, email: str, otp_code: int) -> None:
+        now = datetime.datetime.now()
+        expires_at = now + datetime.timedelta(minutes=5)
+
+        # Upsert the OTP in one round trip; the row is only produced when no
+        # organization owns this email yet, so an empty RETURNING means "taken"
+        otp_row = select(
+            literal(uuid.uuid4(), OTP.id.type),
+            literal(email, OTP.email.type),
+            literal(otp_code, OTP.otp.type),
+            literal(expires_at, OTP.expires_at.type),
+            literal(0, OTP.attempts.type),
+            literal(now, OTP.created_at.type),
+            literal(now, OTP.updated_at.type),
+        ).where(~exists().where(Organization.email == email))
+        stmt = pg_insert(OTP).from_select(
+            ["id", "email", "otp", "expires_at", "attempts", "created_at", "updated_at"], otp_row
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[OTP.email],
+            set_={
+                "otp": stmt.excluded.otp,
+                "expires_at": stmt.excluded.expires_at,
+                "attempts": stmt.excluded.attempts,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ).returning(OTP.id)
+        result = await self.session.execute(stmt)
+        if result.scalar_one_or_none() is None:
+            await self.session.rollback()
+            raise HTTPException(status_code=400, detail="Organization already exists with this email")
         await self.session.commit()
-        await send_email(email, otp_code)
-        return APIResponse(message="OTP sent to email")
 
     async def verify_otp(self, email: str, otp: int):
+        if otp_store_enabled():
+            if await failed_attempts(email) >= OTP_MAX_ATTEMPTS:
+                raise HTTPException(status_code=429, detail="Too many invalid OTP attempts; request a new code")
+            stored_otp = await get_otp(email)
+            if stored_otp is None:
+                raise HTTPException(status_code=400, detail="OTP expired or not found for this email")
+            if not hmac.compare_digest(stored_otp, str(otp)):
+                await record_failed_attempt(email)
+                raise HTTPException(status_code=400, detail="Invalid OTP")
+            # One-shot: a verified code cannot be replayed
+            await delete_otp(email)
+            return static_response(_OTP_VERIFIED_BODY)
+
         result = await self.session.execute(select(OTP).where(OTP.email == email))
         otp_entry = result.scalar_one_or_none()
         if not otp_entry:
             raise HTTPException(status_code=400, detail="No OTP found for this email")
+        if otp_entry.attempts >= OTP_MAX_ATTEMPTS:
+            raise HTTPException(status_code=429, detail="Too many invalid OTP attempts; request a new code")
         if otp_entry.expires_at < datetime.datetime.utcnow():
             raise HTTPException(status_code=400, detail="OTP expired")
-        if otp_entry.otp != otp:
+        if not hmac.compare_digest(str(otp_entry.otp), str(otp)):
+            # Increment in SQL so concurrent wrong guesses are all counted
+            await self.session.execute(
+                update(OTP).where(OTP.id == otp_entry.id).values(attempts=OTP.attempts + 1)
+            )
+            await self.session.commit()
             raise HTTPException(status_code=400, detail="Invalid OTP")
-        return APIResponse(message="OTP verified successfully")
+        # One-shot like the Redis path; RETURNING makes a concurrent replay lose the race
+        consumed = await self.session.scalar(delete(OTP).where(OTP.id == otp_entry.id).returning(OTP.id))
+        await self.session.commit()
+        if consumed is None:
+            raise HTTPException(status_code=400, detail="No OTP found for this email")
+        return static_response(_OTP_VERIFIED_BODY)
 
     async def login(self, email: str, password: str):
         user_result = await self.session.execute(select(UserBlueprint).where(UserBlueprint.email == email))
@@ -59,83 +156,93 @@ class AuthService:
         if not user:
             raise HTTPException(status_code=400, detail="Invalid email or password")
         
-        if not verify_password(password, user.password):
+        valid, new_hash = await verify_and_update_password_async(password, user.password)
+        if not valid:
             raise HTTPException(status_code=400, detail="Invalid email or password")
+        if new_hash:
+            # Legacy bcrypt hash: upgrade to Argon2id now that we have the plaintext
+            user.password = new_hash
+            await self.session.commit()
 
         token = create_jwt_token(user_id=user.id, email=user.email, role=user.role, tenant=tenant_schema.get())
         user_data=await UserService(self.session).get_user_by_email(email=user.email)
+        # Warm /api/users/me so it is served without a DB round-trip
+        await cache_session(tenant_schema.get(), str(user.id), user_data)
 
         return APIResponse(message="Login successful", data={"token": token,
                                                              "user":user_data})
 
+    async def logout(self, user_id: str):
+        await drop_session(tenant_schema.get(), user_id)
+        return static_response(_LOGOUT_BODY)
+
     async def create_organization_with_owner(self, payload: CreateOrganizationRequest):
         subdomain = payload.subdomain.lower()
         unique_slug = secrets.token_hex(8)
         schema_name = f"{subdomain}_{unique_slug}"
         async with self.session.begin():
-            stmt_reserved = select(ReservedSubdomain).where(ReservedSubdomain.subdomain == subdomain)
-            result_reserved = await self.session.execute(stmt_reserved)
-            if result_reserved.scalar_one_or_none():
+            is_reserved = await self.session.scalar(
+                select(exists().where(ReservedSubdomain.subdomain == subdomain))
+            )
+            if is_reserved:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"The subdomain '{payload.subdomain}' is reserved by redagent.dev and cannot be used."
                 )
 
-            stmt_exists = select(Organization).where(
-                (Organization.email == payload.email) | (Organization.subdomain == subdomain)
-            )
-            result_exists = await self.session.execute(stmt_exists)
-            if result_exists.scalar_one_or_none():
-                raise HTTPException(status_code=400, detail="Org with this email or subdomain already exists.")
-
-            await self.session.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"'))
-
             new_org = Organization(
                 email=payload.email,
                 name=payload.org_name,
                 schema_name=schema_name,  # <-- Store the generated unique schema name
                 subdomain=subdomain, # <-- Store the public-facing subdomain
-                status=OrgStatus(payload.status.upper()),
-                rag_type=RagType(payload.rag_type.upper()),
+                # Already normalized and checked by CreateOrganizationRequest
+                status=OrgStatus[payload.status],
+                rag_type=RagType[payload.rag_type],
             )
             self.session.add(new_org)
+            try:
+                # Insert before any DDL; the unique email/subdomain constraints reject
+                # duplicates, including concurrent signups a pre-check would miss
+                await self.session.flush()
+            except IntegrityError:
+                raise HTTPException(status_code=400, detail="Org with this email or subdomain already exists.")
+
+            # The org row is in, so the hash will be used: run it on a worker thread
+            # while the schema is claimed or created
+            hashed_password_task = asyncio.ensure_future(hash_password_async(payload.password))
+            try:
+                # A pre-built schema only needs a rename; create the tables inline if the pool is dry
+                claimed_pooled = await claim_pooled_schema(self.session, schema_name)
+                if not claimed_pooled:
+                    await self.session.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"'))
+                    async with self.session.begin_nested():
+                        conn = await self.session.connection()
+                        await conn.run_sync(tenant_metadata(schema_name).create_all)
+            except BaseException:
+                hashed_password_task.cancel()
+                raise
 
-            async with self.session.begin_nested():
-                conn = await self.session.connection()
-                tenant_tables = TenantUtils.get_tenant_tables()
-                tenant_tables = [tbl for tbl in tenant_tables if tbl.name != 'reserved_subdomains']
-                for table in tenant_tables:
-                    table.schema = schema_name
-                await conn.run_sync(Base.metadata.create_all, tables=tenant_tables)
-                for table in tenant_tables:
-                    table.schema = None
-            
             UserForSchema = get_user_model(schema_name)
-            hashed_password = hash_password(payload.password)
+            hashed_password = await hashed_password_task
             owner_user = UserForSchema(
                 name=payload.name, email=payload.email, password=hashed_password,
                 role=UserRole.ROLE_ADMIN, is_owner=True,
             )
             self.session.add(owner_user)
             await self.session.flush()
-        await self.session.refresh(new_org)
+        # Refill only after the claim has committed, or the refill still counts the claimed row
+        if claimed_pooled:
+            _spawn_background(replenish_schema_pool(), "tenant schema pool top-up")
+        # No refresh: Organization's defaults are client-side, the owner's server
+        # defaults come back via RETURNING (eager_defaults), and commit does not expire
         token = create_jwt_token(user_id=owner_user.id, email=owner_user.email, role=owner_user.role, tenant=new_org.schema_name)
         # // tenant = subdomain
+        created = OrganizationOwnerCreatedResponse.model_construct(
+            organization=OrganizationCreated.from_orm_fast(new_org),
+            owner=OwnerCreated.from_orm_fast(owner_user),
+            token=token,
+        )
         return APIResponse(
             message="Organization and owner created successfully",
-            data={
-                "organization": {
-                    "id": str(new_org.id), "email": new_org.email, "name": new_org.name,
-                    "subdomain": new_org.subdomain,
-                    "rag_type": new_org.rag_type.value,
-                    "status": new_org.status.value,
-                    "created_at": new_org.created_at,
-                },
-                "owner": {
-                    "id": str(owner_user.id), "name": owner_user.name, "email": owner_user.email,
-                    "role": owner_user.role.value, "is_owner": owner_user.is_owner,
-                    "created_at": owner_user.created_at,
-                },
-                "token": token
-            },
+            data=created.model_dump(mode="json"),
         )
\ No newline at end of file
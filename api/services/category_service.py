@@ -1,12 +1,15 @@
 from fastapi import HTTPException
 from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from api.models.category import Category, get_category_model
+from api.schemas.base import list_adapter
 from api.schemas.category import CategoryCreate, CategoryUpdate, CategoryRead
 from api.utils.util_response import APIResponse
 from api.db.tenant import tenant_schema
+from api.utils.acl_cache import invalidate_accessible_categories
 
 class CategoryService:
     def __init__(self, session: AsyncSession):
@@ -20,18 +23,22 @@ class CategoryService:
 
     async def create_category(self, category_data: CategoryCreate) -> CategoryRead:
         """Create a new category."""
-        # Check if category with same name already exists
-        existing_category = await self.get_category_by_name(category_data.name)
-        if existing_category:
-            raise HTTPException(status_code=400, detail="Category with this name already exists")
-        
         category = self.CategoryModel(name=category_data.name)
         self.session.add(category)
-        await self.session.commit()
-        await self.session.refresh(category)
+        await self._commit_unique_name()
+        # Owners see every category, so cached sets for this tenant are stale
+        invalidate_accessible_categories(self.schema_name)
         # return CategoryRead.model_validate(category)
         return category
 
+    async def _commit_unique_name(self) -> None:
+        """Commit, mapping a categories.name unique violation to a 400."""
+        try:
+            await self.session.commit()
+        except IntegrityError:
+            await self.session.rollback()
+            raise HTTPException(status_code=400, detail="Category with this name already exists")
+
     async def get_category_by_id(self, category_id: str) -> Optional[CategoryRead]:
         """Get a category by ID."""
         result = await self.session.execute(select(self.CategoryModel).where(self.CategoryModel.id == category_id))
@@ -52,8 +59,8 @@ class CategoryService:
     async def get_all_categories(self) -> List[CategoryRead]:
         """Get all categories."""
         result = await self.session.execute(select(self.CategoryModel))
-        categories = result.scalars().all()
-        return categories
+        # One batched validation instead of one model_validate per row
+        return list_adapter(CategoryRead).validate_python(result.scalars().all())
 
 
     async def update_category(self, category_id: str, category_data: CategoryUpdate) -> CategoryRead:
@@ -63,29 +70,25 @@ class CategoryService:
         if not category:
             raise HTTPException(status_code=404, detail="Category not found")
 
-        # Check if new name conflicts with existing category
-        if category_data.name and category_data.name != category.name:
-            existing_category = await self.get_category_by_name(category_data.name)
-            if existing_category:
-                raise HTTPException(status_code=400, detail="Category with this name already exists")
-
         # Update fields if provided
         if category_data.name is not None:
             category.name = category_data.name
 
-        await self.session.commit()
-        await self.session.refresh(category)
+        await self._commit_unique_name()
         return category
 
 
     async def delete_category(self, category_id: str) -> bool:
         """Delete a category."""
-        result = await self.session.execute(select(self.CategoryModel).where(self.CategoryModel.id == category_id))
-        category = result.scalar_one_or_none()
-        if not category:
+        # RETURNING doubles as the existence check, so this is one round trip
+        result = await self.session.execute(
+            delete(self.CategoryModel)
+            .where(self.CategoryModel.id == category_id)
+            .returning(self.CategoryModel.id)
+        )
+        if result.scalar_one_or_none() is None:
             raise HTTPException(status_code=404, detail="Category not found")
-
-        await self.session.execute(delete(self.CategoryModel).where(self.CategoryModel.id == category_id))
         await self.session.commit()
+        invalidate_accessible_categories(self.schema_name)
         return True
 
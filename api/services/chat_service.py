@@ -1,72 +1,149 @@
+import base64
+import uuid
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert
+from sqlalchemy import Row, select, insert, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import List, Optional
 
 # Import the SQLAlchemy models and Pydantic schema
 from api.models.chat_history import ChatHistory, get_chat_history_model
-from api.models.chat_tabs import ChatTab, chat_tab_history_association, get_chat_tabs_model
+from api.models.chat_tabs import ChatTab, chat_tab_history_association, get_chat_tabs_model, KB_CHAT_TAB_NAME
 from api.models.user import get_user_model
-from api.schemas.chat_history import ChatHistoryCreate
+from api.schemas.chat_history import ChatHistoryCreate, ChatHistoryPage
 from api.db.tenant import tenant_schema
+from api.utils.history_cache import HISTORY_WINDOW, append_history, get_cached_history, seed_history
+
+
+def _pack_column(values, dtype: str, count: int) -> str:
+    """Pack an iterable of numbers into a base64-encoded contiguous array."""
+    return base64.b64encode(np.fromiter(values, dtype=dtype, count=count).tobytes()).decode("ascii")
+
+@lru_cache(maxsize=512)
+def _chat_models(schema_name: str) -> tuple:
+    """
+    Resolve (ChatHistory model, ChatTab model, association table) for a schema once per
+    process, so building a ChatHistoryService per request is a single dict lookup.
+    """
+    if schema_name == "public":
+        return ChatHistory, ChatTab, chat_tab_history_association
+    # Use the get_user_model function which creates all related models in the same registry;
+    # its ChatTab has the proper FK to users and a schema-aware association table
+    chat_tab_model = get_user_model(schema_name)._ChatTab
+    # ChatHistory is created separately (no FK dependencies)
+    return get_chat_history_model(schema_name), chat_tab_model, chat_tab_model._assoc_chat_history
+
 
 class ChatHistoryService:
     def __init__(self, session: AsyncSession):
         self.session = session
-        # Get the current tenant schema and initialize dynamic models
+        # Get the current tenant schema and its (cached) dynamic models
         self.schema_name = tenant_schema.get()
-        if self.schema_name != "public":
-            # Use the get_user_model function which creates all related models in the same registry
-            user_model_class = get_user_model(self.schema_name)
-            # Get the ChatTab model from the user model's registry (this has proper FK to users)
-            self.ChatTabModel = user_model_class._ChatTab
-            # Create ChatHistory model separately (no FK dependencies)
-            self.ChatHistoryModel = get_chat_history_model(self.schema_name)
-            # Get the schema-aware association table
-            self.chat_tab_history_association = self.ChatTabModel._assoc_chat_history
-        else:
-            self.ChatHistoryModel = ChatHistory
-            self.ChatTabModel = ChatTab
-            self.chat_tab_history_association = chat_tab_history_association
+        self.ChatHistoryModel, self.ChatTabModel, self.chat_tab_history_association = _chat_models(
+            self.schema_name
+        )
 
     async def create_chat_record(self, data: ChatHistoryCreate) -> ChatHistory:
         """
         Creates a new chat history record in the database for the current tenant.
         """
-        # Create a new SQLAlchemy model instance from the Pydantic schema
+        # Create a new SQLAlchemy model instance from the Pydantic schema;
+        # server defaults come back through RETURNING (eager_defaults), so no refresh
         new_chat_record = self.ChatHistoryModel(**data.model_dump())
         
         self.session.add(new_chat_record)
         await self.session.commit()
-        await self.session.refresh(new_chat_record)
         
         return new_chat_record
 
-    async def get_all_chat_records(self) -> List[ChatHistory]:
+    async def create_chat_records(self, data: List[ChatHistoryCreate]) -> List[ChatHistory]:
         """
-        Retrieves all chat history records for the current tenant.
+        Creates several chat history records with one multi-row INSERT ... RETURNING
+        and a single commit, e.g. a user turn and its answer.
         """
-        # Build the query to select all records, ordered by the most recent
-        stmt = select(self.ChatHistoryModel).order_by(self.ChatHistoryModel.created_at.desc())
-        
+        if not data:
+            return []
+        result = await self.session.scalars(
+            insert(self.ChatHistoryModel).returning(self.ChatHistoryModel, sort_by_parameter_order=True),
+            [item.model_dump() for item in data],
+        )
+        records = result.all()
+        await self.session.commit()
+        return records
+
+    async def get_all_chat_records(
+        self,
+        limit: int = 50,
+        before_created_at: Optional[datetime] = None,
+        before_id: Optional[str] = None,
+    ) -> List[Row]:
+        """
+        Retrieves a page of chat history records for the current tenant, most recent first.
+        Pass the created_at and id of the last record seen to get the next page; the
+        (created_at, id) keyset uses ix_chat_history_created_id, so deep pages stay cheap.
+        Rows are plain columns, like get_tab_messages.
+        """
+        model = self.ChatHistoryModel
+        stmt = select(*model.__table__.columns).order_by(model.created_at.desc(), model.id.desc()).limit(limit)
+        if before_created_at is not None and before_id is not None:
+            stmt = stmt.where(tuple_(model.created_at, model.id) < (before_created_at, before_id))
+
         result = await self.session.execute(stmt)
-        return result.scalars().all()
+        return result.all()
 
     # --- Chat sessions (tabs) ---
     async def create_chat_tab(self, name: str, user_id: str) -> ChatTab:
+        if name == KB_CHAT_TAB_NAME:
+            # At most one KB Chat tab per user (uq_chat_tabs_user_kb_chat); hand back
+            # the existing one instead of failing on the unique index
+            result = await self.session.scalars(
+                self._upsert_kb_tab(user_id).returning(self.ChatTabModel)
+            )
+            tab = result.one()
+            await self.session.commit()
+            return tab
+        # Every column is set client-side (id defaults to a Python uuid4), so nothing to refresh
         tab = self.ChatTabModel(name=name, user_id=user_id)
         self.session.add(tab)
         await self.session.commit()
-        await self.session.refresh(tab)
         return tab
 
+    def _upsert_kb_tab(self, user_id: str):
+        return (
+            pg_insert(self.ChatTabModel)
+            .values(id=str(uuid.uuid4()), user_id=user_id, name=KB_CHAT_TAB_NAME)
+            # No-op update so RETURNING yields the existing row on conflict
+            .on_conflict_do_update(
+                index_elements=["user_id", "name"],
+                index_where=text(f"name = '{KB_CHAT_TAB_NAME}'"),
+                set_={"name": KB_CHAT_TAB_NAME},
+            )
+        )
+
+    async def get_or_create_kb_tab(self, user_id: str) -> str:
+        """
+        Returns the id of the user's KB Chat tab, creating it if needed, in a single upsert.
+        """
+        result = await self.session.execute(self._upsert_kb_tab(user_id).returning(self.ChatTabModel.id))
+        tab_id = result.scalar_one()
+        await self.session.commit()
+        return tab_id
+
     async def list_chat_tabs(self, user_id: str) -> List[ChatTab]:
         stmt = select(self.ChatTabModel).where(self.ChatTabModel.user_id == user_id).order_by(self.ChatTabModel.id.desc())
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
-    async def get_tab_messages(self, chat_tab_id: str) -> List[ChatHistory]:
+    async def get_tab_messages(self, chat_tab_id: str) -> List[Row]:
+        """
+        Returns the messages of a tab, oldest first, as plain column rows: nothing is
+        hydrated into the identity map and no relationship can lazy-load per row.
+        """
         stmt = (
-            select(self.ChatHistoryModel)
+            select(*self.ChatHistoryModel.__table__.columns)
             .join(
                 self.chat_tab_history_association,
                 self.chat_tab_history_association.c.chat_history_id == self.ChatHistoryModel.id,
@@ -75,51 +152,112 @@ class ChatHistoryService:
             .order_by(self.ChatHistoryModel.created_at.asc())
         )
         result = await self.session.execute(stmt)
-        return result.scalars().all()
+        return result.all()
+
+    async def get_tab_messages_page(self, chat_tab_id: str) -> ChatHistoryPage:
+        """
+        Same rows as get_tab_messages, returned column-wise: only the needed columns
+        are selected and numeric ones are packed into arrays instead of per-row objects.
+        """
+        model = self.ChatHistoryModel
+        stmt = (
+            select(
+                model.id, model.question, model.answer,
+                model.latency, model.token_prompt, model.token_completion, model.created_at,
+            )
+            .join(
+                self.chat_tab_history_association,
+                self.chat_tab_history_association.c.chat_history_id == model.id,
+            )
+            .where(self.chat_tab_history_association.c.chat_tab_id == chat_tab_id)
+            .order_by(model.created_at.asc())
+        )
+        rows = (await self.session.execute(stmt)).all()
+        n = len(rows)
+        return ChatHistoryPage.model_construct(
+            ids=[row.id for row in rows],
+            questions=[row.question for row in rows],
+            answers=[row.answer for row in rows],
+            latencies=_pack_column((-1 if row.latency is None else row.latency for row in rows), "<i4", n),
+            tokens_prompt=_pack_column((-1 if row.token_prompt is None else row.token_prompt for row in rows), "<i4", n),
+            tokens_completion=_pack_column((-1 if row.token_completion is None else row.token_completion for row in rows), "<i4", n),
+            created_at=_pack_column((int(row.created_at.timestamp() * 1000) for row in rows), "<i8", n),
+        )
 
     async def append_message_to_tab(self, chat_tab_id: str, data: ChatHistoryCreate) -> ChatHistory:
-        # Persist message
-        message = self.ChatHistoryModel(**data.model_dump())
-        self.session.add(message)
-        await self.session.flush()
+        messages = await self.append_messages_to_tab(chat_tab_id, [data])
+        return messages[0]
+
+    async def append_messages_to_tab(self, chat_tab_id: str, data: List[ChatHistoryCreate]) -> List[ChatHistory]:
+        """
+        Persists several messages and links them to a tab with one multi-row INSERT ... RETURNING
+        per table and a single commit; server defaults come back with the rows, so no refresh.
+        """
+        if not data:
+            return []
+        result = await self.session.scalars(
+            insert(self.ChatHistoryModel).returning(self.ChatHistoryModel, sort_by_parameter_order=True),
+            [item.model_dump() for item in data],
+        )
+        messages = result.all()
 
         # Link to tab via association table
         await self.session.execute(
-            insert(self.chat_tab_history_association).values(
-                chat_tab_id=chat_tab_id,
-                chat_history_id=message.id,
-            )
+            insert(self.chat_tab_history_association),
+            [{"chat_tab_id": chat_tab_id, "chat_history_id": message.id} for message in messages],
         )
-
         await self.session.commit()
-        await self.session.refresh(message)
-        return message
 
-    async def build_history_context(self, chat_tab_id: str, max_messages: int = 20) -> str:
-        messages = await self.get_tab_messages(chat_tab_id)
-        if not messages:
+        # Only extends windows that were seeded from the DB; a missing one is rebuilt on next read
+        await append_history(
+            self.schema_name, chat_tab_id, [(message.question, message.answer) for message in messages]
+        )
+        return messages
+
+    async def get_recent_tab_messages(self, chat_tab_id: str, limit: int = HISTORY_WINDOW) -> List[tuple]:
+        """
+        Returns the last `limit` (question, answer) pairs of a tab, oldest first.
+        """
+        stmt = (
+            select(self.ChatHistoryModel.question, self.ChatHistoryModel.answer)
+            .join(
+                self.chat_tab_history_association,
+                self.chat_tab_history_association.c.chat_history_id == self.ChatHistoryModel.id,
+            )
+            .where(self.chat_tab_history_association.c.chat_tab_id == chat_tab_id)
+            .order_by(self.ChatHistoryModel.created_at.desc())
+            .limit(limit)
+        )
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in reversed(result.all())]
+
+    async def build_history_context(self, chat_tab_id: str, max_messages: int = HISTORY_WINDOW) -> str:
+        recent = await get_cached_history(self.schema_name, chat_tab_id)
+        if recent is None:
+            recent = await self.get_recent_tab_messages(chat_tab_id)
+            await seed_history(self.schema_name, chat_tab_id, recent)
+        if not recent:
             return ""
-        # Keep only the last N messages for prompt length
-        tail = messages[-max_messages:]
-        parts: List[str] = []
-        for m in tail:
-            parts.append(f"Q: {m.question}\nA: {m.answer if m.answer else ''}")
-        return "\n\n".join(parts)
+        # Keep only the last N messages for prompt length, without copying the window
+        tail = islice(recent, max(len(recent) - max_messages, 0), None)
+        return "\n\n".join(f"Q: {question}\nA: {answer if answer else ''}" for question, answer in tail)
 
     async def initiate_new_chat(self, user_id: str, tab_name: str, first_message: ChatHistoryCreate) -> tuple[ChatTab, ChatHistory]:
         """
         Creates a new chat tab and adds the first message to it in a single transaction.
         Returns both the tab and the first message.
         """
-        # Create the tab first
-        tab = self.ChatTabModel(name=tab_name, user_id=user_id)
-        self.session.add(tab)
-        await self.session.flush()  # Get the tab ID without committing
-
-        # Create the first message
-        message = self.ChatHistoryModel(**first_message.model_dump())
-        self.session.add(message)
-        await self.session.flush()  # Get the message ID without committing
+        # Tab and first message come back from their INSERTs, so nothing is flushed or refreshed
+        tab = (
+            await self.session.scalars(
+                insert(self.ChatTabModel).values(name=tab_name, user_id=user_id).returning(self.ChatTabModel)
+            )
+        ).one()
+        message = (
+            await self.session.scalars(
+                insert(self.ChatHistoryModel).values(**first_message.model_dump()).returning(self.ChatHistoryModel)
+            )
+        ).one()
 
         # Link message to tab
         await self.session.execute(
@@ -131,7 +269,5 @@ class ChatHistoryService:
 
         # Commit everything together
         await self.session.commit()
-        await self.session.refresh(tab)
-        await self.session.refresh(message)
-        
-        return tab, message
\ No newline at end of file
+
+        return tab, message
@@ -1,17 +1,21 @@
+import io
 import logging
 import uuid
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterable, List, Optional, Set, Tuple
 
-from sqlalchemy import select, update, and_, text
+from sqlalchemy import select, update, and_, or_, exists, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.db.database import AsyncSessionLocal
-from api.db.tenant import tenant_schema
+from api.db.tenant import set_search_path, tenant_schema
 from api.models.category import Category, get_category_model
-from api.models.knowledge_base import KnowledgeBase, get_knowledge_base_model, KBStatus
+from api.models.knowledge_base import KnowledgeBase, KBStatus, resolve_knowledge_base_model
+from api.models.user import User, user_categories
 from api.schemas.rag_schemas import VectorDocumentCreate
 from api.services.rag_service import RAGService
+from api.utils.process_pool import run_in_process
+from api.utils.uploads import discard_upload
 
 
 logger = logging.getLogger(__name__)
@@ -32,11 +36,10 @@ class KnowledgeBaseService:
 
     def _initialize_models(self) -> None:
         """Initialize the appropriate models based on the tenant schema."""
+        self.KnowledgeBaseModel = resolve_knowledge_base_model(self.schema_name)
         if self.schema_name != "public":
-            self.KnowledgeBaseModel = get_knowledge_base_model(self.schema_name)
             self.CategoryModel = get_category_model(self.schema_name)
         else:
-            self.KnowledgeBaseModel = KnowledgeBase
             self.CategoryModel = Category
 
     async def get_user_documents(
@@ -44,14 +47,17 @@ class KnowledgeBaseService:
         user_id: str,
         tenant_schema: str,
         db_session: AsyncSession,
+        skip: int = 0,
+        limit: int = 50,
     ) -> List[KnowledgeBase]:
-        """Retrieve all documents for a specific user."""
-        await self._set_search_path(db_session, tenant_schema)
-        
+        """Retrieve one page of a user's documents, newest first."""
+        # Served by ix_kb_user_created (user_id, created_at DESC) without a sort step
         result = await db_session.execute(
             select(self.KnowledgeBaseModel)
             .where(self.KnowledgeBaseModel.user_id == user_id)
             .order_by(self.KnowledgeBaseModel.created_at.desc())
+            .offset(skip)
+            .limit(limit)
         )
         return result.scalars().all()
 
@@ -63,8 +69,6 @@ class KnowledgeBaseService:
         db_session: AsyncSession,
     ) -> Optional[KnowledgeBase]:
         """Get the status of a specific document for a user."""
-        await self._set_search_path(db_session, tenant_schema)
-        
         result = await db_session.execute(
             select(self.KnowledgeBaseModel).where(
                 and_(
@@ -82,12 +86,11 @@ class KnowledgeBaseService:
         db_session: AsyncSession
     ) -> bool:
         """Check if a category exists in the specified tenant."""
-        await self._set_search_path(db_session, tenant_schema)
-        
+        # EXISTS stops at the first PK match and returns a single boolean, not the row
         result = await db_session.execute(
-            select(self.CategoryModel).where(self.CategoryModel.id == category_id)
+            select(exists().where(self.CategoryModel.id == category_id))
         )
-        return result.scalar_one_or_none() is not None
+        return bool(result.scalar())
 
     async def ensure_access_to_category(
         self,
@@ -97,10 +100,57 @@ class KnowledgeBaseService:
         db_session: AsyncSession,
     ) -> bool:
         """Check if a user has access to a specific category."""
+        return bool(await self.ensure_access_to_categories(user_id, tenant_schema, [category_id], db_session))
+
+    async def ensure_access_to_categories(
+        self,
+        user_id: str,
+        tenant_schema: str,
+        category_ids: Iterable[str],
+        db_session: AsyncSession,
+    ) -> Set[str]:
+        """
+        Return the subset of `category_ids` the user can access, with a single lookup
+        of the user's accessible set (itself served from the per-process ACL cache).
+        """
         accessible_categories = await self.rag_service.get_accessible_categories(
             user_id, tenant_schema, db_session
         )
-        return category_id in accessible_categories
+        return set(category_ids) & accessible_categories
+
+    async def validate_access(
+        self,
+        user_id: str,
+        category_id: str,
+        tenant_schema: str,
+        db_session: AsyncSession,
+    ) -> Tuple[bool, bool]:
+        """
+        Check category existence and user access in a single round-trip.
+
+        Returns (category_exists, has_access); owners have access to every category.
+        Unlike the model-based lookups, this reads the unqualified user blueprints,
+        so it still pins the search_path.
+        """
+        await self._set_search_path(db_session, tenant_schema)
+
+        category_exists = exists().where(self.CategoryModel.id == category_id)
+        is_linked = exists().where(
+            and_(
+                user_categories.c.user_id == user_id,
+                user_categories.c.category_id == category_id,
+            )
+        )
+        is_owner = exists().where(and_(User.id == user_id, User.is_owner.is_(True)))
+
+        result = await db_session.execute(
+            select(
+                category_exists.label("category_exists"),
+                or_(is_linked, is_owner).label("has_access"),
+            )
+        )
+        row = result.one()
+        return bool(row.category_exists), bool(row.has_access)
 
     async def create_kb_record(
         self,
@@ -111,10 +161,9 @@ class KnowledgeBaseService:
         file_size: Optional[int],
         tenant_schema: str,
         db_session: AsyncSession,
+        file_hash: Optional[str] = None,
     ) -> KnowledgeBase:
         """Create a new knowledge base record."""
-        await self._set_search_path(db_session, tenant_schema)
-        
         kb_record = self.KnowledgeBaseModel(
             id=str(uuid.uuid4()),
             user_id=user_id,
@@ -122,6 +171,7 @@ class KnowledgeBaseService:
             category_id=category_id,
             mime=mime,
             file_size=file_size,
+            file_hash=file_hash,
             status=KBStatus.UPLOADED,
         )
         
@@ -133,11 +183,12 @@ class KnowledgeBaseService:
     async def process_document_background(
         self,
         knowledge_base_id: str,
-        file_content: bytes,
+        file_path: str,
         mime_type: str,
         user_id: str,
         category_id: str,
         tenant_schema: str,
+        file_hash: Optional[str] = None,
     ) -> None:
         """Process a document in the background with comprehensive error handling."""
         logger.info(f"Starting background processing for document {knowledge_base_id} in tenant {tenant_schema}")
@@ -149,13 +200,14 @@ class KnowledgeBaseService:
             try:
                 await self._process_document_successfully(
                     knowledge_base_id,
-                    file_content,
+                    file_path,
                     mime_type,
                     user_id,
                     category_id,
                     tenant_schema,
                     db_session,
-                    knowledge_base_model
+                    knowledge_base_model,
+                    file_hash,
                 )
             except Exception as e:
                 await self._handle_processing_error(
@@ -164,32 +216,49 @@ class KnowledgeBaseService:
                     e,
                     knowledge_base_model
                 )
+            finally:
+                # The spooled upload is only needed for this run
+                discard_upload(file_path)
 
     async def _process_document_successfully(
         self,
         knowledge_base_id: str,
-        file_content: bytes,
+        file_path: str,
         mime_type: str,
         user_id: str,
         category_id: str,
         tenant_schema: str,
         db_session: AsyncSession,
-        knowledge_base_model
+        knowledge_base_model,
+        file_hash: Optional[str] = None,
     ) -> None:
         """Handle successful document processing workflow."""
         logger.info("Created database session for background processing")
         await self._set_search_path(db_session, tenant_schema)
 
-        # Update status to INGESTING
-        await self._update_document_status(
-            knowledge_base_id,
-            KBStatus.INGESTING,
-            db_session,
-            knowledge_base_model
-        )
+        # No intermediate INGESTING write: pollers only act on the final
+        # COMPLETED/FAILED status, so each document costs a single status update
+
+        # Identical content was already processed: reuse its vectors and stop here
+        if file_hash:
+            source_id = await self._find_processed_duplicate(
+                knowledge_base_id, file_hash, db_session, knowledge_base_model
+            )
+            if source_id:
+                await self.rag_service.copy_vectors_from_file(
+                    source_id, knowledge_base_id, user_id, category_id, db_session
+                )
+                await self._update_document_status(
+                    knowledge_base_id,
+                    KBStatus.COMPLETED,
+                    db_session,
+                    knowledge_base_model
+                )
+                logger.info(f"Reused vectors of document {source_id} for duplicate upload {knowledge_base_id}")
+                return
 
         # Extract text content
-        text_content = await self.extract_text_from_file(file_content, mime_type)
+        text_content = await self.extract_text_from_file(file_path, mime_type)
         logger.info(f"Extracted text content, length: {len(text_content)}")
         
         metadata = {
@@ -208,13 +277,15 @@ class KnowledgeBaseService:
         )
         logger.info(f"Processed document into {len(vector_docs)} vector documents")
 
-        # Store vector documents
+        # Store vector documents; committed below together with the status change,
+        # so a document is never COMPLETED without its vectors (or vice versa)
         await self.rag_service.store_vector_documents(
             vector_docs,
             user_id,
             category_id,
             db_session,
-            tenant_schema
+            tenant_schema,
+            commit=False,
         )
         logger.info("Stored vector documents in database")
 
@@ -226,6 +297,27 @@ class KnowledgeBaseService:
             knowledge_base_model
         )
 
+    async def _find_processed_duplicate(
+        self,
+        knowledge_base_id: str,
+        file_hash: str,
+        db_session: AsyncSession,
+        knowledge_base_model
+    ) -> Optional[str]:
+        """Return the id of a completed document with the same content hash, if any."""
+        result = await db_session.execute(
+            select(knowledge_base_model.id)
+            .where(
+                and_(
+                    knowledge_base_model.file_hash == file_hash,
+                    knowledge_base_model.status == KBStatus.COMPLETED,
+                    knowledge_base_model.id != knowledge_base_id,
+                )
+            )
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
     async def _handle_processing_error(
         self,
         knowledge_base_id: str,
@@ -285,55 +377,21 @@ class KnowledgeBaseService:
 
     def _get_knowledge_base_model_for_tenant(self, tenant_schema: str):
         """Get the appropriate knowledge base model for the tenant."""
-        if tenant_schema != "public":
-            return get_knowledge_base_model(tenant_schema)
-        return KnowledgeBase
+        return resolve_knowledge_base_model(tenant_schema)
 
     async def _set_search_path(self, db_session: AsyncSession, tenant_schema: str) -> None:
         """Set the search path for the database session."""
-        await db_session.execute(text(f'SET search_path TO "{tenant_schema}"'))
-
-    @staticmethod
-    async def extract_text_from_file(file_content: bytes, mime_type: str) -> str:
-        """Extract text content from various file types."""
-        try:
-            if mime_type == "application/pdf":
-                return await KnowledgeBaseService._extract_pdf_text(file_content)
-            elif mime_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-                return await KnowledgeBaseService._extract_docx_text(file_content)
-            elif mime_type.startswith("text/"):
-                return file_content.decode("utf-8")
-            else:
-                return f"Unsupported file type: {mime_type}"
-        except Exception as e:
-            logger.error(f"Error extracting text from file: {str(e)}")
-            return f"Error extracting text: {str(e)}"
+        await set_search_path(db_session, tenant_schema)
 
     @staticmethod
-    async def _extract_pdf_text(file_content: bytes) -> str:
-        """Extract text from PDF files."""
-        import io
-        import PyPDF2
-        
-        reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        text_out = "".join(page.extract_text() or "" for page in reader.pages)
-        return text_out.strip()
-
-    @staticmethod
-    async def _extract_docx_text(file_content: bytes) -> str:
-        """Extract text from DOCX files."""
-        import io
-        from docx import Document
-        
-        doc = Document(io.BytesIO(file_content))
-        return "\n".join(p.text for p in doc.paragraphs)
+    async def extract_text_from_file(file_path: str, mime_type: str) -> str:
+        """Extract text content from a spooled upload in the shared process pool."""
+        return await run_in_process(_extract_text_sync, file_path, mime_type)
 
     async def validate_background_task_setup(self, tenant_schema: str) -> bool:
         """Validate that the background task can connect to the database and access required services."""
         try:
             async with AsyncSessionLocal() as db_session:
-                await self._set_search_path(db_session, tenant_schema)
-                
                 # Test a simple query to ensure connection works
                 result = await db_session.execute(text("SELECT 1"))
                 result.scalar()
@@ -345,3 +403,42 @@ class KnowledgeBaseService:
             return False
 
 
+# Module-level (picklable) extraction helpers executed in worker processes
+def _extract_text_sync(file_path: str, mime_type: str) -> str:
+    """Extract text content from various file types."""
+    try:
+        if mime_type == "application/pdf":
+            return _extract_pdf_text(file_path)
+        elif mime_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+            return _extract_docx_text(file_path)
+        elif mime_type.startswith("text/"):
+            with open(file_path, "r", encoding="utf-8") as f:
+                return f.read()
+        else:
+            return f"Unsupported file type: {mime_type}"
+    except Exception as e:
+        logger.error(f"Error extracting text from file: {str(e)}")
+        return f"Error extracting text: {str(e)}"
+
+
+def _extract_pdf_text(file_path: str) -> str:
+    """Extract text from PDF files."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    # Write pages into one buffer as they are parsed instead of holding every page
+    # string until a final join
+    buffer = io.StringIO()
+    for page in reader.pages:
+        buffer.write(page.extract_text() or "")
+        # Keep the last word of a page apart from the first word of the next
+        buffer.write("\n")
+    return buffer.getvalue().strip()
+
+
+def _extract_docx_text(file_path: str) -> str:
+    """Extract text from DOCX files."""
+    from docx import Document
+
+    doc = Document(file_path)
+    return "\n".join(p.text for p in doc.paragraphs)
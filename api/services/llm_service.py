@@ -1,17 +1,84 @@
+import hashlib
 import os
 import logging
-from typing import List, Tuple, Optional
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, List, Tuple, Optional
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema import HumanMessage, SystemMessage
+from cachetools import TTLCache
+from api.config import LLM_RESPONSE_CACHE_SIZE, LLM_RESPONSE_CACHE_TTL
 from api.models.vector_doc import VectorDoc as VectorDocument
 
 logger = logging.getLogger(__name__)
 
+NO_RESULTS_RESPONSE = "I couldn't find any relevant information to answer your question."
+
+# Retrieved text sent to the LLM per prompt; prompt size (latency and cost) grows with it
+MAX_CONTEXT_CHARS = 12_000
+
+
+def _build_openai_llm() -> ChatOpenAI:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OpenAI API key is required")
+    return ChatOpenAI(
+        model="gpt-3.5-turbo",
+        temperature=0.7,
+        openai_api_key=api_key
+    )
+
+
+def _build_google_llm() -> ChatGoogleGenerativeAI:
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("Google API key is required")
+    return ChatGoogleGenerativeAI(
+        model="gemini-1.5-pro",
+        temperature=0.7,
+        google_api_key=api_key
+    )
+
+
+# Keys match the LLMModel literal accepted by the chat request schemas
+_LLM_BUILDERS: Dict[str, Callable[[], object]] = {
+    "openai": _build_openai_llm,
+    "google": _build_google_llm,
+}
+
+
+# One chat client per model for the whole process, shared by every LLMService instance
+# so their HTTP connection pools are reused across requests
+@lru_cache(maxsize=8)
+def _get_client(model: str):
+    builder = _LLM_BUILDERS.get(model)
+    if builder is None:
+        raise ValueError(f"Unsupported model: {model}")
+    return builder()
+
+
+# Per-process cache of generated answers keyed by _response_cache_key; entries expire
+# after LLM_RESPONSE_CACHE_TTL and the least recently used are evicted past the size cap
+_response_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=LLM_RESPONSE_CACHE_SIZE, ttl=LLM_RESPONSE_CACHE_TTL) if LLM_RESPONSE_CACHE_TTL > 0 else None
+)
+_response_cache_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+
+def _response_cache_key(
+    model: str,
+    query: str,
+    search_results: List[Tuple[VectorDocument, float]],
+    history_context: Optional[str],
+) -> str:
+    doc_ids = ",".join(sorted(str(doc.id) for doc, _ in search_results))
+    raw = f"{model}\x00{query.strip().lower()}\x00{doc_ids}\x00{history_context or ''}"
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
 class LLMService:
     def __init__(self, model: str = "openai"):
         self._model = model
-        self._llm = None
         
     @property
     def model(self):
@@ -19,76 +86,116 @@ class LLMService:
         
     @model.setter
     def model(self, value):
-        if self._model != value:
-            self._model = value
-            self._llm = None  # Reset cached LLM when model changes
+        self._model = value
     
     @property
     def llm(self):
-        if self._llm is None:
-            if self._model == "openai":
-                api_key = os.getenv("OPENAI_API_KEY")
-                if not api_key:
-                    raise ValueError("OpenAI API key is required")
-                self._llm = ChatOpenAI(
-                    model="gpt-3.5-turbo",
-                    temperature=0.7,
-                    openai_api_key=api_key
-                )
-            elif self._model == "google":
-                api_key = os.getenv("GOOGLE_API_KEY")
-                if not api_key:
-                    raise ValueError("Google API key is required")
-                self._llm = ChatGoogleGenerativeAI(
-                    model="gemini-1.5-pro",
-                    temperature=0.7,
-                    google_api_key=api_key
-                )
-            else:
-                raise ValueError(f"Unsupported model: {self._model}")
-        return self._llm
-    
+        return self.get_llm(self._model)
+
+    def get_llm(self, model: str):
+        """Return the process-wide chat client for `model`, creating it on first use."""
+        return _get_client(model)
+
+    @staticmethod
+    def cache_stats() -> Dict[str, int]:
+        """Hit/miss counters and current size of the per-process response cache."""
+        size = len(_response_cache) if _response_cache is not None else 0
+        return {**_response_cache_stats, "size": size}
+
+    @staticmethod
+    def _build_messages(
+        query: str,
+        search_results: List[Tuple[VectorDocument, float]],
+        history_context: Optional[str] = None,
+    ) -> list:
+        """Build the system/user prompt from retrieved documents and prior turns."""
+        # Prepare context from search results (best match first), stopping once the
+        # character budget is spent and clipping the document that crosses it
+        sections = []
+        remaining = MAX_CONTEXT_CHARS
+        for i, (doc, score) in enumerate(search_results):
+            if remaining <= 0:
+                break
+            chunk_text = doc.chunk_text[:remaining]
+            remaining -= len(chunk_text)
+            sections.append(f"Document {i+1} (relevance: {score:.3f}):\n{chunk_text}")
+        context = "\n\n".join(sections)
+        
+        # Optional prior conversation context
+        conversation = ""
+        if history_context:
+            conversation = f"\n\nConversation so far (chronological):\n{history_context}"
+
+        # Create system prompt
+        system_prompt = (
+            "You are a helpful assistant that answers questions based on the provided context. "
+            "Use only the information from the context to answer the question. If the context doesn't contain "
+            "enough information to answer the question, say so.\n\n"
+            f"Context:\n{context}{conversation}\n\n"
+            f"Question: {query}\n\n"
+            "Answer:"
+        )
+        
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=query)
+        ]
+
     async def generate_response(
         self,
         query: str,
         search_results: List[Tuple[VectorDocument, float]],
         history_context: Optional[str] = None,
+        model: Optional[str] = None,
     ) -> str:
-        """Generate a response using the LLM based on retrieved documents."""
+        """Generate a response using the LLM based on retrieved documents.
+
+        `model` selects the client per call without mutating the shared service.
+        """
         try:
             if not search_results:
-                return "I couldn't find any relevant information to answer your question."
-            
-            # Prepare context from search results
-            context = "\n\n".join([
-                f"Document {i+1} (relevance: {score:.3f}):\n{doc.chunk_text}"
-                for i, (doc, score) in enumerate(search_results)
-            ])
-            
-            # Optional prior conversation context
-            conversation = ""
-            if history_context:
-                conversation = f"\n\nConversation so far (chronological):\n{history_context}"
-
-            # Create system prompt
-            system_prompt = (
-                "You are a helpful assistant that answers questions based on the provided context. "
-                "Use only the information from the context to answer the question. If the context doesn't contain "
-                "enough information to answer the question, say so.\n\n"
-                f"Context:\n{context}{conversation}\n\n"
-                f"Question: {query}\n\n"
-                "Answer:"
-            )
+                return NO_RESULTS_RESPONSE
             
+            model = model or self._model
+            cache_key = None
+            if _response_cache is not None:
+                cache_key = _response_cache_key(model, query, search_results, history_context)
+                cached = _response_cache.get(cache_key)
+                if cached is not None:
+                    _response_cache_stats["hits"] += 1
+                    return cached
+                _response_cache_stats["misses"] += 1
+
             # Generate response
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=query)
-            ]
-            
-            response = await self.llm.ainvoke(messages)
+            messages = self._build_messages(query, search_results, history_context)
+            llm = self.get_llm(model)
+            response = await llm.ainvoke(messages)
+            if cache_key is not None:
+                _response_cache[cache_key] = response.content
             return response.content
             
         except Exception as e:
             logger.error(f"Error generating LLM response: {str(e)}")
             return f"Sorry, I encountered an error while generating a response: {str(e)}"
+
+    async def stream_response(
+        self,
+        query: str,
+        search_results: List[Tuple[VectorDocument, float]],
+        history_context: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Streaming variant of generate_response: yields answer text as the LLM produces it."""
+        if not search_results:
+            yield NO_RESULTS_RESPONSE
+            return
+
+        try:
+            messages = self._build_messages(query, search_results, history_context)
+            llm = self.get_llm(model or self._model)
+            async for chunk in llm.astream(messages):
+                if chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            logger.error(f"Error streaming LLM response: {str(e)}")
+            yield f"Sorry, I encountered an error while generating a response: {str(e)}"
@@ -1,9 +1,184 @@
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text, select
-from api.db.database import Base
+import asyncio
+import logging
+import secrets
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy import MetaData, delete, func, select, text, union
+from api.config import TENANT_SCHEMA_POOL_SIZE
+from api.db.database import engine
+from api.models.chat_tabs import KB_CHAT_TAB_NAME
 from api.models.organization import Organization
+from api.models.tenant_schema_pool import TenantSchemaPool
 from api.utils.TenantUtils import TenantUtils
 
+logger = logging.getLogger(__name__)
+
+# Tenant schemas synced at once by sync_all_tenants
+SYNC_CONCURRENCY = 8
+
+# Tables already present in each of the given schemas, in one catalog round-trip
+_EXISTING_TABLES = text(
+    "SELECT table_schema, table_name FROM information_schema.tables WHERE table_schema = ANY(:schemas)"
+)
+
+# Older tenants may hold several KB Chat tabs per user, which would block the unique
+# index below. Rank each user's KB Chat tabs (the one with the earliest message first,
+# then by id), move the others' messages onto the first and delete them. The ranking is
+# the same before and after the move, so both statements agree on which tab is kept.
+_KB_CHAT_TABS_RANKED = (
+    "WITH ranked AS ("
+    "SELECT t.id, t.user_id, ROW_NUMBER() OVER ("
+    "PARTITION BY t.user_id ORDER BY MIN(h.created_at) NULLS LAST, t.id) AS rn "
+    'FROM "{schema}".chat_tabs t '
+    'LEFT JOIN "{schema}".chat_tab_history_association a ON a.chat_tab_id = t.id '
+    'LEFT JOIN "{schema}".chat_history h ON h.id = a.chat_history_id '
+    f"WHERE t.name = '{KB_CHAT_TAB_NAME}' GROUP BY t.id, t.user_id) "
+)
+_DEDUPE_KB_CHAT_TABS = [
+    _KB_CHAT_TABS_RANKED
+    + 'UPDATE "{schema}".chat_tab_history_association a SET chat_tab_id = keep.id '
+    "FROM ranked dup JOIN ranked keep ON keep.user_id = dup.user_id AND keep.rn = 1 "
+    "WHERE dup.rn > 1 AND a.chat_tab_id = dup.id AND NOT EXISTS ("
+    'SELECT 1 FROM "{schema}".chat_tab_history_association k '
+    "WHERE k.chat_tab_id = keep.id AND k.chat_history_id = a.chat_history_id)",
+    _KB_CHAT_TABS_RANKED
+    + 'DELETE FROM "{schema}".chat_tabs t USING ranked WHERE t.id = ranked.id AND ranked.rn > 1',
+]
+
+# Idempotent DDL applied to every existing tenant schema on startup, for columns
+# added after a tenant was provisioned ({schema} is substituted per tenant)
+TENANT_MIGRATIONS = [
+    'ALTER TABLE IF EXISTS "{schema}".knowledge_base ADD COLUMN IF NOT EXISTS file_hash VARCHAR(64)',
+    'CREATE INDEX IF NOT EXISTS ix_knowledge_base_file_hash ON "{schema}".knowledge_base (file_hash)',
+    'CREATE INDEX IF NOT EXISTS ix_kb_user_created ON "{schema}".knowledge_base (user_id, created_at DESC) '
+    'INCLUDE (file_name, category_id, mime, file_size, status, s3_url)',
+    # Keep the oldest category under each name and suffix later duplicates, so the unique
+    # index can be built without deleting categories (and cascading their documents)
+    'UPDATE "{schema}".categories c '
+    "SET name = c.name || ' (' || dup.rn || ')' "
+    "FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY name ORDER BY created_at, id) AS rn "
+    'FROM "{schema}".categories) dup WHERE c.id = dup.id AND dup.rn > 1',
+    'CREATE UNIQUE INDEX IF NOT EXISTS categories_name_key ON "{schema}".categories (name)',
+    'CREATE INDEX IF NOT EXISTS ix_chat_history_created_id ON "{schema}".chat_history (created_at, id)',
+    'CREATE INDEX IF NOT EXISTS idx_chat_tab_history_chat_history_id '
+    'ON "{schema}".chat_tab_history_association (chat_history_id)',
+    *_DEDUPE_KB_CHAT_TABS,
+    'CREATE UNIQUE INDEX IF NOT EXISTS uq_chat_tabs_user_kb_chat ON "{schema}".chat_tabs (user_id, name) '
+    f"WHERE name = '{KB_CHAT_TAB_NAME}'",
+    # vector_doc layout: metadata column, halfvec(768) embeddings and their HNSW index.
+    # Superseded ANN indexes go first, since they cannot be rebuilt on the halfvec column.
+    'ALTER TABLE IF EXISTS "{schema}".vector_doc ADD COLUMN IF NOT EXISTS doc_metadata JSON',
+    'DROP INDEX IF EXISTS "{schema}".idx_vector_doc_embedding_halfvec_hnsw',
+    'DROP INDEX IF EXISTS "{schema}".idx_vector_doc_embedding_hnsw',
+    'DROP INDEX IF EXISTS "{schema}".idx_vector_doc_embedding',
+    # Only rewrites tables still on full-precision vector, so the lock is taken once
+    "DO $$ BEGIN "
+    "IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema = '{schema}' "
+    "AND table_name = 'vector_doc' AND column_name = 'embedding' AND udt_name = 'vector') THEN "
+    'ALTER TABLE "{schema}".vector_doc ALTER COLUMN embedding TYPE halfvec(768) USING embedding::halfvec(768); '
+    "END IF; END $$",
+    'CREATE INDEX IF NOT EXISTS idx_vector_doc_category_id ON "{schema}".vector_doc (category_id)',
+    'CREATE INDEX IF NOT EXISTS idx_vector_doc_embedding_hnsw_halfvec ON "{schema}".vector_doc '
+    'USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)',
+]
+
+
+async def apply_tenant_migrations(conn: AsyncConnection) -> None:
+    """
+    Bring every tenant schema, including unclaimed pool schemas, up to date with TENANT_MIGRATIONS.
+    """
+    result = await conn.execute(union(select(Organization.schema_name), select(TenantSchemaPool.name)))
+    for schema_name in result.scalars().all():
+        # One savepoint per schema: a tenant whose data blocks a migration is logged and
+        # left as it was, instead of aborting startup for every tenant
+        try:
+            async with conn.begin_nested():
+                for statement in TENANT_MIGRATIONS:
+                    await conn.execute(text(statement.format(schema=schema_name)))
+        except Exception as e:
+            logger.error(f"Tenant migrations failed for schema {schema_name}: {str(e)}")
+
+
+@lru_cache(maxsize=1)
+def _tenant_tables() -> tuple:
+    # Resolved on first use, once every model module has registered its table
+    return tuple(
+        table for table in TenantUtils.get_tenant_tables() if table.name != "reserved_subdomains"
+    )
+
+
+def tenant_metadata(schema_name: str) -> MetaData:
+    """
+    Copy the tenant table blueprints into a private MetaData bound to `schema_name`.
+    Unlike setting Table.schema on the shared blueprints, this is safe while other
+    requests use those tables concurrently; FKs between tenant tables follow the copy.
+    """
+    metadata = MetaData()
+    for table in _tenant_tables():
+        table.to_metadata(metadata, schema=schema_name)
+    return metadata
+
+
+# Session-level advisory lock held while the schema pool is being refilled
+_LOCK_SCHEMA_POOL = text("SELECT pg_advisory_lock(hashtext('tenant_schema_pool'))")
+_UNLOCK_SCHEMA_POOL = text("SELECT pg_advisory_unlock(hashtext('tenant_schema_pool'))")
+
+
+async def claim_pooled_schema(session: AsyncSession, schema_name: str) -> bool:
+    """
+    Take one pre-provisioned schema and rename it to `schema_name`, inside the caller's
+    transaction (so a rollback returns it to the pool). Returns False when the pool is
+    empty and the caller has to create the tables itself.
+    """
+    next_free = (
+        select(TenantSchemaPool.name)
+        .order_by(TenantSchemaPool.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    pooled = await session.scalar(
+        delete(TenantSchemaPool).where(TenantSchemaPool.name == next_free).returning(TenantSchemaPool.name)
+    )
+    if pooled is None:
+        return False
+    await session.execute(text(f'ALTER SCHEMA "{pooled}" RENAME TO "{schema_name}"'))
+    return True
+
+
+async def replenish_schema_pool(target: Optional[int] = None) -> int:
+    """
+    Top the pool back up to `target` schemas (TENANT_SCHEMA_POOL_SIZE by default), one
+    transaction per schema so onboarding can claim each as soon as it is ready.
+    Returns how many schemas were created.
+    """
+    target = TENANT_SCHEMA_POOL_SIZE if target is None else target
+    created = 0
+    async with engine.connect() as lock_conn:
+        # Serialize refills across workers and processes: whoever waits recounts after
+        # the holder is done, so N workers starting together do not each fill the gap
+        await lock_conn.execute(_LOCK_SCHEMA_POOL)
+        await lock_conn.commit()
+        try:
+            available = await lock_conn.scalar(select(func.count()).select_from(TenantSchemaPool))
+            await lock_conn.commit()
+            for _ in range(max(target - available, 0)):
+                name = f"tenant_pool_{secrets.token_hex(8)}"
+                async with engine.begin() as conn:
+                    await conn.execute(text(f'CREATE SCHEMA "{name}"'))
+                    await conn.run_sync(tenant_metadata(name).create_all)
+                    await conn.execute(TenantSchemaPool.__table__.insert().values(name=name))
+                created += 1
+        finally:
+            await lock_conn.execute(_UNLOCK_SCHEMA_POOL)
+            await lock_conn.commit()
+    if created:
+        logger.info(f"Provisioned {created} pooled tenant schema(s)")
+    return created
+
+
 class OnboardingService:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -31,29 +206,34 @@ class OnboardingService:
         
     async def sync_all_tenants(self):
         """
-        Ensures all existing tenants have all the latest tables.
+        Ensures all existing tenants (and unclaimed pool schemas) have all the latest tables.
+        Missing tables are found with one catalog query for every schema, so up-to-date
+        schemas cost nothing; the rest are synced concurrently, each on its own connection
+        and transaction. The DDL is schema-qualified, so no search_path switching is needed.
         """
-        # Get all tenant schemas from the public organizations table
-        result = await self.session.execute(select(Organization.schema_name))
+        result = await self.session.execute(
+            union(select(Organization.schema_name), select(TenantSchemaPool.name))
+        )
         all_schemas = result.scalars().all()
-        
-        # Get the list of table blueprints that should exist for every tenant
-        tenant_tables = TenantUtils.get_tenant_tables()
 
-        # Get the underlying connection once
-        connection = await self.session.connection()
-        
-        synced_schemas = []
-        for schema_name in all_schemas:
-            # For each tenant, switch to their schema
-            await self.session.execute(text(f'SET search_path TO "{schema_name}"'))
-            
-            # Run create_all on the connection
-            await connection.run_sync(
-                Base.metadata.create_all, tables=tenant_tables, checkfirst=True
-            )
-            synced_schemas.append(schema_name)
-        
-        # Revert search_path to public
-        await self.session.execute(text('SET search_path TO "public"'))
-        return synced_schemas
\ No newline at end of file
+        existing = await self.session.execute(_EXISTING_TABLES, {"schemas": list(all_schemas)})
+        present = {}
+        for schema_name, table_name in existing.all():
+            present.setdefault(schema_name, set()).add(table_name)
+        required = {table.name for table in _tenant_tables()}
+
+        # Bounded so a large fleet does not open a connection (and take catalog locks) per tenant at once
+        semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+        async def sync_one(schema_name: str, missing: set) -> None:
+            metadata = tenant_metadata(schema_name)
+            tables = [table for table in metadata.sorted_tables if table.name in missing]
+            async with semaphore, engine.begin() as conn:
+                # checkfirst now only probes the few missing tables (and their enum types)
+                await conn.run_sync(metadata.create_all, tables=tables, checkfirst=True)
+
+        pending = {schema_name: required - present.get(schema_name, set()) for schema_name in all_schemas}
+        await asyncio.gather(*(
+            sync_one(schema_name, missing) for schema_name, missing in pending.items() if missing
+        ))
+        return list(all_schemas)
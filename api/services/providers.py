@@ -0,0 +1,29 @@
+from fastapi import FastAPI, Request
+
+from api.services.kb_service import KnowledgeBaseService
+from api.services.llm_service import LLMService
+from api.services.rag_service import RAGService
+
+
+def init_services(app: FastAPI) -> None:
+    """
+    Build the shared RAG/KB/LLM services once per worker process.
+    Called from the application lifespan so nothing is created at import time.
+    """
+    rag_service = RAGService(embedding_model="google", api_key=None)
+    app.state.rag_service = rag_service
+    app.state.kb_service = KnowledgeBaseService(rag_service)
+    app.state.llm_service = LLMService(model="openai")
+
+
+# --- FastAPI dependencies ---
+def get_rag_service(request: Request) -> RAGService:
+    return request.app.state.rag_service
+
+
+def get_kb_service(request: Request) -> KnowledgeBaseService:
+    return request.app.state.kb_service
+
+
+def get_llm_service(request: Request) -> LLMService:
+    return request.app.state.llm_service
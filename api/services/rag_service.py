@@ -1,12 +1,15 @@
+import csv
 import hashlib
+import io
 import logging
 import json
-from typing import List, Dict, Any, Optional, Tuple
+import uuid
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple, Iterable, FrozenSet
 from datetime import datetime
 import asyncio
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores.pgvector import PGVector
 from langchain_openai import OpenAIEmbeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
@@ -16,11 +19,45 @@ from api.models.knowledge_base import KnowledgeBase, KBStatus
 from api.models.vector_doc import VectorDoc, get_vector_doc_model
 from api.schemas.rag_schemas import VectorDocumentCreate
 from api.db.database import AsyncSessionLocal
-from sqlalchemy import select, and_, or_, text
+from api.db.tenant import set_search_path
+from api.utils.acl_cache import get_cached_categories, set_cached_categories
+from api.utils.process_pool import run_in_process
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
 
 logger = logging.getLogger(__name__)
 
+VECTOR_DOC_TABLE = "vector_doc"
+VECTOR_DOC_COPY_COLUMNS = [
+    "id", "user_id", "category_id", "file_id",
+    "chunk_id", "chunk_text", "embedding", "doc_metadata",
+]
+
+EMBEDDING_DIM = 768
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Embedding provider batching: inputs per request and max requests in flight
+EMBEDDING_BATCH_SIZE = 96
+EMBEDDING_CONCURRENCY = 4
+
+
+@lru_cache(maxsize=8)
+def _get_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+
+def split_text_into_chunks(text_content: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """Split text into overlapping chunks; module-level so it can run in worker processes."""
+    return _get_text_splitter(chunk_size, chunk_overlap).split_text(text_content)
+
 
 class RAGService:
     """Service for handling RAG operations including document processing and retrieval."""
@@ -48,12 +85,11 @@ class RAGService:
             self.api_key = api_key
             
         self._embeddings = None
-        self._text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        # Bounds concurrent embedding requests across all documents being processed
+        self._embedding_semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+        # Single-flight map: concurrent identical queries share one embedding call
+        self._inflight_queries: Dict[str, asyncio.Task] = {}
+        self._text_splitter = _get_text_splitter(CHUNK_SIZE, CHUNK_OVERLAP)
         
         # Log the configuration
         logger.info(f"RAG Service initialized with model: {embedding_model}")
@@ -85,18 +121,6 @@ class RAGService:
         """Generate SHA-256 hash for text chunk to prevent duplicates."""
         return hashlib.sha256(text.encode('utf-8')).hexdigest()
     
-    def _embedding_to_string(self, embedding: List[float]) -> str:
-        """Convert embedding list to string representation for storage."""
-        return json.dumps(embedding)
-    
-    def _string_to_embedding(self, embedding_str: str) -> List[float]:
-        """Convert string representation back to embedding list."""
-        try:
-            return json.loads(embedding_str)
-        except (json.JSONDecodeError, TypeError):
-            logger.warning(f"Failed to parse embedding string: {embedding_str[:50]}...")
-            return []
-    
     async def process_document(
         self, 
         file_id: str, 
@@ -121,18 +145,20 @@ class RAGService:
         try:
             # Note: This method assumes the search_path is already set by the caller
             # Split text into chunks
-            chunks = self._text_splitter.split_text(file_content)
+            # Splitting is pure-Python CPU work; run it in the process pool
+            chunks = await run_in_process(split_text_into_chunks, file_content, CHUNK_SIZE, CHUNK_OVERLAP)
             logger.info(f"Split document into {len(chunks)} chunks")
             
             # Generate embeddings for chunks
             embeddings = await self._generate_embeddings(chunks)
             
+            # Skip chunks already stored for this file, looked up in one query
+            existing_chunk_ids = await self._get_existing_chunk_ids(file_id, db_session, tenant_schema)
+            
             # Create vector document objects
             vector_docs = []
             for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                # Check if this file's chunk already exists by (file_id, chunk_id)
-                exists = await self._check_chunk_exists(file_id, i, db_session, tenant_schema)
-                if exists:
+                if i in existing_chunk_ids:
                     logger.info(f"Chunk {i} already exists for file {file_id}, skipping")
                     continue
                 
@@ -160,21 +186,61 @@ class RAGService:
             raise
     
     async def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts."""
+        """
+        Generate embeddings for a list of texts.
+
+        Texts are sent in batches of EMBEDDING_BATCH_SIZE, with at most
+        EMBEDDING_CONCURRENCY requests in flight across the whole service.
+        """
         try:
-            # Use async embedding generation if available
-            if hasattr(self.embeddings, 'aembed_documents'):
-                embeddings = await self.embeddings.aembed_documents(texts)
-            else:
-                embeddings = self.embeddings.embed_documents(texts)
-            
-            return embeddings
+            batches = [
+                texts[start:start + EMBEDDING_BATCH_SIZE]
+                for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+            ]
+            results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+            return [embedding for batch_embeddings in results for embedding in batch_embeddings]
         except Exception as e:
             logger.error(f"Error generating embeddings: {str(e)}")
             raise
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        async with self._embedding_semaphore:
+            # Use async embedding generation if available
+            if hasattr(self.embeddings, 'aembed_documents'):
+                return await self.embeddings.aembed_documents(texts)
+            return await asyncio.to_thread(self.embeddings.embed_documents, texts)
     
-    async def _check_chunk_exists(self, file_id: str, chunk_id: int, db_session: AsyncSession, tenant_schema: str = "public") -> bool:
-        """Check if a chunk for this file and index already exists."""
+    async def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a search query, coalescing concurrent calls for the same text.
+
+        The first caller starts the embedding task; later callers await the same
+        task (shielded, so one request being cancelled doesn't cancel the others).
+        """
+        task = self._inflight_queries.get(query)
+        if task is None:
+            task = asyncio.create_task(self._embed_single_query(query))
+            self._inflight_queries[query] = task
+            task.add_done_callback(lambda t: self._finish_inflight_query(query, t))
+        return await asyncio.shield(task)
+
+    def _finish_inflight_query(self, query: str, task: asyncio.Task) -> None:
+        """Drop a finished single-flight entry and mark its exception as retrieved."""
+        if self._inflight_queries.get(query) is task:
+            del self._inflight_queries[query]
+        if not task.cancelled():
+            task.exception()
+
+    async def _embed_single_query(self, query: str) -> List[float]:
+        embeddings = await self._generate_embeddings([query])
+        query_vector = embeddings[0]
+        # Normalize to plain Python list to avoid numpy truthiness issues
+        if hasattr(query_vector, "tolist"):
+            query_vector = query_vector.tolist()
+        return query_vector
+
+    async def _get_existing_chunk_ids(self, file_id: str, db_session: AsyncSession, tenant_schema: str = "public") -> set:
+        """Return the chunk ids already stored for this file."""
         try:
             # Note: This method assumes the search_path is already set by the caller
             # Create dynamic model for tenant schema
@@ -184,12 +250,12 @@ class RAGService:
                 VectorDocModel = VectorDoc
                 
             result = await db_session.execute(
-                select(VectorDocModel.id).where(and_(VectorDocModel.file_id == file_id, VectorDocModel.chunk_id == chunk_id))
+                select(VectorDocModel.chunk_id).where(VectorDocModel.file_id == file_id)
             )
-            return result.scalar_one_or_none() is not None
+            return set(result.scalars().all())
         except Exception as e:
-            logger.error(f"Error checking chunk existence: {str(e)}")
-            return False
+            logger.error(f"Error checking existing chunks: {str(e)}")
+            return set()
     
     async def store_vector_documents(
         self, 
@@ -197,7 +263,8 @@ class RAGService:
         user_id: str,
         category_id: str,
         db_session: AsyncSession,
-        tenant_schema: str = "public"
+        tenant_schema: str = "public",
+        commit: bool = True,
     ) -> int:
         """
         Store vector documents in the database.
@@ -207,39 +274,50 @@ class RAGService:
             user_id: ID of the user who uploaded the document
             category_id: ID of the document category
             db_session: AsyncSession
+            commit: Commit the COPY; pass False to let the caller commit it together
+                with its own writes
             
         Returns:
             Number of documents stored
         """
         try:
-            # Note: This method assumes the search_path is already set by the caller
-            # Ensure schema has expected columns/types
-            await self._ensure_vector_doc_schema(db_session)
-            
-            # Create dynamic model for tenant schema
-            if tenant_schema != "public":
-                # Create VectorDocModel only - avoid creating other models that might already exist
-                VectorDocModel = get_vector_doc_model(tenant_schema)
-            else:
-                VectorDocModel = VectorDoc
-                
-            stored_count = 0
+            # Note: This method assumes the search_path is already set by the caller;
+            # the vector_doc layout itself is kept current by TENANT_MIGRATIONS at startup
+            if not vector_docs:
+                return 0
+
+            # Bulk-load through COPY on the underlying asyncpg connection. The rows go
+            # over in CSV text form, with embeddings as halfvec literals, so no type
+            # codec has to be set on the pooled connection (which would also clear its
+            # prepared statement cache); created_at/updated_at use their server defaults
+            buffer = io.StringIO()
+            # Quote every field so empty strings are not read back as NULL
+            writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n")
             for vector_doc in vector_docs:
-                # Create VectorDocument model instance
-                db_vector_doc = VectorDocModel(
-                    user_id=user_id,
-                    category_id=category_id,
-                    file_id=vector_doc.file_id,
-                    chunk_id=vector_doc.chunk_id,
-                    chunk_text=vector_doc.chunk_text,
-                    embedding=vector_doc.embedding,
-                    doc_metadata=vector_doc.metadata
-                )
-                
-                db_session.add(db_vector_doc)
-                stored_count += 1
-            
-            await db_session.commit()
+                writer.writerow((
+                    str(uuid.uuid4()),
+                    user_id,
+                    category_id,
+                    vector_doc.file_id,
+                    vector_doc.chunk_id,
+                    vector_doc.chunk_text,
+                    "[" + ",".join(map(str, vector_doc.embedding)) + "]",
+                    json.dumps(vector_doc.doc_metadata),
+                ))
+
+            conn = await db_session.connection()
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_to_table(
+                VECTOR_DOC_TABLE,
+                source=io.BytesIO(buffer.getvalue().encode("utf-8")),
+                columns=VECTOR_DOC_COPY_COLUMNS,
+                schema_name=tenant_schema,
+                format="csv",
+            )
+            stored_count = len(vector_docs)
+
+            if commit:
+                await db_session.commit()
             logger.info(f"Stored {stored_count} vector documents")
             return stored_count
             
@@ -248,38 +326,48 @@ class RAGService:
             logger.error(f"Error storing vector documents: {str(e)}")
             raise
 
-    async def _ensure_vector_doc_schema(self, db_session: AsyncSession) -> None:
-        """Best-effort guard to align vector_doc schema at runtime.
-        - Adds doc_metadata column if missing
-        - Adjusts embedding dimension to 768 if different
+    async def copy_vectors_from_file(
+        self,
+        source_file_id: str,
+        target_file_id: str,
+        user_id: str,
+        category_id: str,
+        db_session: AsyncSession,
+    ) -> int:
         """
-        try:
-            # Add doc_metadata column if it does not exist
-            await db_session.execute(
-                text("ALTER TABLE vector_doc ADD COLUMN IF NOT EXISTS doc_metadata JSON")
-            )
-            # Attempt to set embedding to vector(768) if not already
-            try:
-                await db_session.execute(
-                    text("ALTER TABLE vector_doc ALTER COLUMN embedding TYPE vector(768)")
-                )
-            except Exception:
-                # Ignore if type is already compatible or cannot be altered
-                pass
-            await db_session.commit()
-        except Exception:
-            # Non-fatal; proceed with inserts and let DB surface concrete errors if any
-            await db_session.rollback()
-            return
-    
+        Copy the stored chunks of an already-processed file onto a new file in one
+        INSERT ... SELECT, so duplicate uploads skip extraction and embedding.
+
+        Returns the number of chunks copied. Assumes the search_path is set by the caller.
+        """
+        result = await db_session.execute(
+            text(
+                f"INSERT INTO {VECTOR_DOC_TABLE} "
+                "(id, user_id, category_id, file_id, chunk_id, chunk_text, embedding, doc_metadata) "
+                "SELECT gen_random_uuid()::text, :user_id, :category_id, :target_file_id, "
+                "chunk_id, chunk_text, embedding, doc_metadata "
+                f"FROM {VECTOR_DOC_TABLE} WHERE file_id = :source_file_id"
+            ),
+            {
+                "user_id": user_id,
+                "category_id": category_id,
+                "target_file_id": target_file_id,
+                "source_file_id": source_file_id,
+            },
+        )
+        copied = result.rowcount
+        logger.info(f"Copied {copied} vector documents from file {source_file_id} to {target_file_id}")
+        return copied
+
     async def search_similar_documents(
         self,
         query: str,
         user_roles: List[str],
-        category_ids: List[str],
+        category_ids: Iterable[str],
         db_session: AsyncSession,
         top_k: int = 5,
-        tenant_schema: str = "public"
+        tenant_schema: str = "public",
+        include_embedding: bool = False,
     ) -> List[Tuple[VectorDoc, float]]:
         """
         Search for similar documents based on query and user access.
@@ -287,9 +375,12 @@ class RAGService:
         Args:
             query: Search query
             user_roles: List of user roles
-            category_ids: List of accessible category IDs
+            category_ids: Accessible category IDs (any iterable, e.g. the frozenset
+                returned by get_accessible_categories)
             top_k: Number of top results to return
             db_session: AsyncSession
+            include_embedding: Load the stored embedding on the returned rows
+                (deferred by default; callers only need the chunk text)
             
         Returns:
             List of tuples containing (VectorDoc, similarity_score)
@@ -297,11 +388,7 @@ class RAGService:
         try:
             # Note: This method assumes the search_path is already set by the caller
             # Generate embedding for the query
-            query_embedding = await self._generate_embeddings([query])
-            query_vector = query_embedding[0]
-            # Normalize to plain Python list to avoid numpy truthiness issues
-            if hasattr(query_vector, "tolist"):
-                query_vector = query_vector.tolist()
+            query_vector = await self.embed_query(query)
             
             # Create dynamic model for tenant schema
             if tenant_schema != "public":
@@ -309,45 +396,35 @@ class RAGService:
             else:
                 VectorDocModel = VectorDoc
                 
-            # Build the search query with role-based access control
-            search_query = select(VectorDocModel).where(
-                and_(
-                    VectorDocModel.category_id.in_(category_ids),
-                    # Add vector similarity search here when pgvector is properly configured
-                )
-            ).limit(top_k)
-            
-            # For now, return basic search results
-            # TODO: Implement proper vector similarity search with pgvector
+            category_ids = list(category_ids)
+            if not category_ids:
+                return []
+
+            # Pre-filter on category_id, then let the halfvec HNSW index order by cosine distance
+            distance = VectorDocModel.embedding.cosine_distance(query_vector)
+            search_query = (
+                select(VectorDocModel, distance.label("distance"))
+                .where(VectorDocModel.category_id.in_(category_ids))
+                .order_by(distance)
+                .limit(top_k)
+            )
+            if not include_embedding:
+                search_query = search_query.options(defer(VectorDocModel.embedding))
+
             result = await db_session.execute(search_query)
-            documents = result.scalars().all()
-            
-            # Calculate basic similarity scores (placeholder)
-            results = []
-            for doc in documents:
-                # Normalize stored embedding to list
-                doc_embedding = doc.embedding
-                if hasattr(doc_embedding, "tolist"):
-                    doc_embedding = doc_embedding.tolist()
-                # Skip if shape mismatches
-                if doc_embedding is None:
-                    continue
-                if len(doc_embedding) != len(query_vector):
-                    continue
-                similarity = self._calculate_cosine_similarity(query_vector, doc_embedding)
-                results.append((doc, similarity))
-            
-            # Sort by similarity score
-            results.sort(key=lambda x: x[1], reverse=True)
-            
-            return results[:top_k]
+
+            # Cosine similarity is 1 - cosine distance
+            return [(doc, 1.0 - float(dist)) for doc, dist in result.all()]
             
         except Exception as e:
             logger.error(f"Error searching documents: {str(e)}")
             raise
     
     def _calculate_cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors."""
+        """Calculate cosine similarity between two vectors.
+
+        Not used for retrieval (Postgres ranks with pgvector); kept for offline checks.
+        """
         try:
             if len(vec1) != len(vec2):
                 return 0.0
@@ -368,9 +445,9 @@ class RAGService:
         user_id: str,
         tenant_schema: str,
         db_session: AsyncSession,
-    ) -> List[str]:
+    ) -> FrozenSet[str]:
         """
-        Get list of category IDs that the user can access.
+        Get the set of category IDs that the user can access.
         
         Args:
             user_roles: List of user roles
@@ -378,11 +455,15 @@ class RAGService:
             db_session: AsyncSession
             
         Returns:
-            List of accessible category IDs
+            Frozenset of accessible category IDs (O(1) membership checks)
         """
         try:
             # Set the search path to the tenant's schema
-            await db_session.execute(text(f'SET search_path TO "{tenant_schema}"'))
+            await set_search_path(db_session, tenant_schema)
+
+            cached = get_cached_categories(tenant_schema, user_id)
+            if cached is not None:
+                return cached
             
             # Check if user is owner; if yes, they get access to all categories
             owner_result = await db_session.execute(
@@ -392,10 +473,11 @@ class RAGService:
             if is_owner:
                 all_q = select(Category.id)
                 all_res = await db_session.execute(all_q)
-                all_ids = [row[0] for row in all_res.all()]
+                all_ids = frozenset(all_res.scalars().all())
                 logger.info(
                     f"User {user_id} is owner in {tenant_schema}; granting access to all categories: {len(all_ids)}"
                 )
+                set_cached_categories(tenant_schema, user_id, all_ids)
                 return all_ids
 
             # Non-owners: Categories accessible if linked via association table
@@ -407,10 +489,11 @@ class RAGService:
             )
 
             result = await db_session.execute(query)
-            category_ids = [row[0] for row in result.all()]
+            category_ids = frozenset(result.scalars().all())
             logger.info(f"Accessible category IDs for user {user_id}: {category_ids}")
+            set_cached_categories(tenant_schema, user_id, category_ids)
             return category_ids
             
         except Exception as e:
             logger.error(f"Error getting accessible categories: {str(e)}")
-            return []
+            return frozenset()
@@ -25,7 +25,6 @@ class ReservedSubdomainService:
         )
         self.session.add(new_subdomain)
         await self.session.commit()
-        await self.session.refresh(new_subdomain)
         return new_subdomain
 
     async def get_all_subdomains(self) -> List[ReservedSubdomain]:
@@ -62,7 +61,6 @@ class ReservedSubdomainService:
             subdomain_to_update.description = update_data['description']
 
         await self.session.commit()
-        await self.session.refresh(subdomain_to_update)
         return subdomain_to_update
 
     async def delete_subdomain(self, subdomain_id: str) -> None:
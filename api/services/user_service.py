@@ -1,5 +1,4 @@
 import datetime
-import random
 from fastapi import HTTPException
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -10,11 +9,14 @@ from api.models.organization import Organization
 from api.models.otp import OTP
 from api.models.user import User, get_user_model
 from api.models.category import Category, get_category_model
+from api.schemas.base import list_adapter
 from api.schemas.user import UserCreate, UserUpdate, UserRead
 from api.utils.email_sender import send_email
 from api.utils.util_response import APIResponse
-from api.utils.security import hash_password, verify_password
+from api.utils.security import hash_password_async, verify_password
 from api.db.tenant import tenant_schema
+from api.utils.acl_cache import invalidate_accessible_categories
+from api.utils.session_cache import drop_session
 
 class UserService:
     def __init__(self, session: AsyncSession):
@@ -46,7 +48,7 @@ class UserService:
                 raise HTTPException(status_code=400, detail="One or more categories not found")
         
         # Hash password
-        hashed_password = hash_password(user_data.password)
+        hashed_password = await hash_password_async(user_data.password)
         
         # Create user (is_owner is always False for CRUD created users)
         user = self.UserModel(
@@ -140,7 +142,7 @@ class UserService:
         )
         users = result.scalars().all()
         
-        user_list = []
+        user_dicts = []
         for user in users:
             user_dict = {
                 "id": user.id,
@@ -152,9 +154,9 @@ class UserService:
                 "updated_at": user.updated_at,
                 "categories": [{"id": cat.id, "name": cat.name} for cat in user.categories]
             }
-            user_list.append(UserRead.model_validate(user_dict))
+            user_dicts.append(user_dict)
         
-        return user_list
+        return list_adapter(UserRead).validate_python(user_dicts)
 
 
     async def update_user(self, user_id: str, user_data: UserUpdate) -> UserRead:
@@ -190,7 +192,7 @@ class UserService:
         if user_data.role is not None:
             user.role = user_data.role
         if user_data.password is not None:
-            user.password = hash_password(user_data.password)
+            user.password = await hash_password_async(user_data.password)
 
         # Update categories if provided
         if user_data.category_ids is not None:
@@ -203,6 +205,9 @@ class UserService:
                 user.categories = []  # Clear all categories
 
         await self.session.commit()
+        if user_data.category_ids is not None:
+            invalidate_accessible_categories(self.schema_name, user_id)
+        await drop_session(self.schema_name, user_id)
         await self.session.refresh(user)
         
         curr_user= await self.get_user_by_id(user.id)
@@ -222,5 +227,7 @@ class UserService:
 
         await self.session.execute(delete(self.UserModel).where(self.UserModel.id == user_id))
         await self.session.commit()
+        invalidate_accessible_categories(self.schema_name, user_id)
+        await drop_session(self.schema_name, user_id)
         return True
 
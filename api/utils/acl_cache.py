@@ -0,0 +1,25 @@
+from typing import FrozenSet, Optional
+
+from cachetools import TTLCache
+
+# Short-lived per-process cache of accessible category IDs keyed by (tenant, user_id).
+# Mappings only change through user/category admin routes, which invalidate below;
+# the TTL bounds staleness across worker processes.
+_ACL_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+
+
+def get_cached_categories(tenant_schema: str, user_id: str) -> Optional[FrozenSet[str]]:
+    return _ACL_CACHE.get((tenant_schema, user_id))
+
+
+def set_cached_categories(tenant_schema: str, user_id: str, category_ids: FrozenSet[str]) -> None:
+    _ACL_CACHE[(tenant_schema, user_id)] = category_ids
+
+
+def invalidate_accessible_categories(tenant_schema: str, user_id: Optional[str] = None) -> None:
+    """Drop cached entries for one user, or for the whole tenant when user_id is None."""
+    if user_id is not None:
+        _ACL_CACHE.pop((tenant_schema, user_id), None)
+        return
+    for key in [key for key in list(_ACL_CACHE.keys()) if key[0] == tenant_schema]:
+        _ACL_CACHE.pop(key, None)
@@ -0,0 +1,20 @@
+import base64
+from typing import Union
+
+import numpy as np
+
+# Compact wire format for embeddings: base64 of big-endian float32, 4 bytes per dimension.
+# Avoids building and emitting one Python float per dimension.
+WIRE_DTYPE = ">f4"
+
+
+def encode_embedding_b64(values) -> str:
+    """Encode a list, ndarray or pgvector Vector/HalfVector as base64 float32."""
+    if hasattr(values, "to_numpy"):
+        values = values.to_numpy()
+    return base64.b64encode(np.asarray(values, dtype=WIRE_DTYPE).tobytes()).decode("ascii")
+
+
+def decode_embedding_b64(data: Union[str, bytes]) -> np.ndarray:
+    """Decode a base64 float32 embedding without copying the decoded buffer."""
+    return np.frombuffer(base64.b64decode(data), dtype=WIRE_DTYPE)
@@ -0,0 +1,66 @@
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import orjson
+
+from api.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Recent (question, answer) pairs per chat tab, shared by every worker through Redis.
+# Seeded from the DB on a miss and extended on each append; the TTL bounds staleness
+# if an append races a seed. Without REDIS_URL every read goes to the DB.
+HISTORY_WINDOW = 20
+HISTORY_TTL_SECONDS = 300
+
+
+def _history_key(tenant_schema: str, chat_tab_id: str) -> str:
+    return f"hist:{tenant_schema}:{chat_tab_id}"
+
+
+async def get_cached_history(tenant_schema: str, chat_tab_id: str) -> Optional[List[Tuple[str, str]]]:
+    """The cached window for a tab, oldest first; None on a miss or without Redis."""
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        items = await client.lrange(_history_key(tenant_schema, chat_tab_id), 0, -1)
+    except Exception as e:
+        logger.error(f"Failed to read cached history for tab {chat_tab_id}: {str(e)}")
+        return None
+    # Empty tabs are never cached, so an empty list is a miss
+    if not items:
+        return None
+    return [tuple(orjson.loads(item)) for item in items]
+
+
+async def seed_history(tenant_schema: str, chat_tab_id: str, pairs: Sequence[Tuple[str, str]]) -> None:
+    """Replace the cached window with `pairs` read from the DB."""
+    client = get_redis()
+    if client is None or not pairs:
+        return
+    key = _history_key(tenant_schema, chat_tab_id)
+    try:
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.rpush(key, *(orjson.dumps(list(pair)) for pair in pairs[-HISTORY_WINDOW:]))
+            pipe.expire(key, HISTORY_TTL_SECONDS)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to cache history for tab {chat_tab_id}: {str(e)}")
+
+
+async def append_history(tenant_schema: str, chat_tab_id: str, pairs: Sequence[Tuple[str, str]]) -> None:
+    """Extend a cached window in place; a tab that is not cached is left to the next seed."""
+    client = get_redis()
+    if client is None or not pairs:
+        return
+    key = _history_key(tenant_schema, chat_tab_id)
+    try:
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.rpushx(key, *(orjson.dumps(list(pair)) for pair in pairs))
+            pipe.ltrim(key, -HISTORY_WINDOW, -1)
+            pipe.expire(key, HISTORY_TTL_SECONDS)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to extend cached history for tab {chat_tab_id}: {str(e)}")
@@ -0,0 +1,54 @@
+from typing import Optional
+
+from api.utils.redis_client import get_redis
+
+# Signup OTPs live in Redis when it is configured: SETEX handles expiry, so there are
+# no OTP rows to write, read or purge. Without REDIS_URL, AuthService falls back to
+# the Postgres OTP table.
+OTP_TTL_SECONDS = 300
+# Wrong guesses allowed per issued code before verify_otp answers 429
+OTP_MAX_ATTEMPTS = 5
+
+
+def otp_store_enabled() -> bool:
+    return get_redis() is not None
+
+
+def _otp_key(email: str) -> str:
+    return f"otp:{email}"
+
+
+def _fail_key(email: str) -> str:
+    return f"otp:fail:{email}"
+
+
+async def store_otp(email: str, otp: int) -> None:
+    """Issue a new code for `email`, resetting its failed-attempt counter."""
+    async with get_redis().pipeline(transaction=True) as pipe:
+        pipe.setex(_otp_key(email), OTP_TTL_SECONDS, str(otp))
+        pipe.delete(_fail_key(email))
+        await pipe.execute()
+
+
+async def get_otp(email: str) -> Optional[str]:
+    """The pending OTP for `email`, or None if there is none or it has expired."""
+    stored = await get_redis().get(_otp_key(email))
+    return stored.decode() if stored is not None else None
+
+
+async def delete_otp(email: str) -> None:
+    await get_redis().delete(_otp_key(email), _fail_key(email))
+
+
+async def failed_attempts(email: str) -> int:
+    count = await get_redis().get(_fail_key(email))
+    return int(count) if count is not None else 0
+
+
+async def record_failed_attempt(email: str) -> int:
+    """Count a wrong guess; the counter expires OTP_TTL_SECONDS after the last one."""
+    async with get_redis().pipeline(transaction=True) as pipe:
+        pipe.incr(_fail_key(email))
+        pipe.expire(_fail_key(email), OTP_TTL_SECONDS)
+        count, _ = await pipe.execute()
+    return count
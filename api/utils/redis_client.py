@@ -0,0 +1,20 @@
+from api.config import REDIS_URL
+
+_redis = None
+
+
+def get_redis():
+    """Shared async Redis client, created lazily; None when REDIS_URL is not configured."""
+    global _redis
+    if _redis is None and REDIS_URL:
+        import redis.asyncio as redis
+
+        _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
+
+
+async def close_redis() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -1,5 +1,9 @@
 # api/utils/response.py
 from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+
 from api.utils.util_response import APIResponse
 
 def create_response(
@@ -17,3 +21,21 @@ def create_response(
         success=success,
         total_count=total_count
     )
+
+
+def static_response_body(message: str) -> bytes:
+    """
+    Serialize a fixed APIResponse once, at import time, for endpoints whose
+    success body never changes. Return it with static_response().
+    """
+    return orjson.dumps(APIResponse(message=message).model_dump())
+
+
+def static_response(body: bytes, status_code: int = 200) -> Response:
+    """Wrap pre-serialized JSON bytes; skips model construction and encoding per call."""
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+
+def sse_event(payload: dict) -> bytes:
+    """Encode one Server-Sent Events `data:` frame."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
@@ -1,14 +1,24 @@
 # api/utils/security.py
+import asyncio
 from datetime import timedelta, timezone
 from datetime import datetime
+from typing import Optional, Tuple
 from uuid import UUID
 from passlib.context import CryptContext
 import jwt
 
 from api.config import JWT_SECRET_KEY
 from api.schemas.user import UserRole
-# bcrypt context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Argon2id for new hashes (OWASP: m=46 MiB, t=3, p=1, via argon2-cffi). bcrypt stays
+# verifiable for existing accounts and is rehashed to Argon2id on the next login.
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__time_cost=3,
+    argon2__memory_cost=46 * 1024,
+    argon2__parallelism=1,
+)
 
 def hash_password(password: str) -> str:
     """Hash a plain password using bcrypt."""
@@ -18,7 +28,30 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed one."""
     return pwd_context.verify(plain_password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    """hash_password on a worker thread; bcrypt takes ~100ms and would stall the event loop."""
+    return await asyncio.to_thread(hash_password, password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on a worker thread, for the same reason as hash_password_async."""
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify on a worker thread and return (valid, new_hash). new_hash is set when the
+    stored hash uses a deprecated scheme or parameters and should be replaced.
+    """
+    return await asyncio.to_thread(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+
+
+# Shared encoder/decoder; algorithm and header are fixed here so each call does not
+# rebuild them
+_JWT_ALGORITHM = "HS256"
+_JWT_ALGORITHMS = [_JWT_ALGORITHM]
+_JWT_HEADERS = {"typ": "JWT"}
+_jwt = jwt.PyJWT()
 
 
 def create_jwt_token(
@@ -46,7 +79,7 @@ def create_jwt_token(
         "role": role.value,         
     }
 
-    encoded_jwt = jwt.encode(payload, secret_key, algorithm="HS256")
+    encoded_jwt = _jwt.encode(payload, secret_key, algorithm=_JWT_ALGORITHM, headers=_JWT_HEADERS)
     
     return encoded_jwt
 
@@ -56,12 +89,8 @@ import jwt
 
 def decode_jwt_token(token: str) -> dict:
     """Decode a JWT token and return the payload."""
-    print("Decoding JWT token...",token,JWT_SECRET_KEY)
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
-        print("Decoding JWT token1...",token,JWT_SECRET_KEY,payload)
-
-        return payload
+        return _jwt.decode(token, JWT_SECRET_KEY, algorithms=_JWT_ALGORITHMS)
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
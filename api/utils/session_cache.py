@@ -0,0 +1,50 @@
+import logging
+from typing import Any, Dict, Optional
+
+import orjson
+
+from api.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Cached /me payload per logged-in user, warmed on login and dropped on logout or
+# user update/delete. Category renames are not tracked, so the TTL bounds staleness.
+SESSION_TTL_SECONDS = 3600
+
+
+def _session_key(tenant_schema: str, user_id: str) -> str:
+    return f"sess:{tenant_schema}:{user_id}"
+
+
+async def cache_session(tenant_schema: str, user_id: str, user_data: Dict[str, Any]) -> None:
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        await client.setex(_session_key(tenant_schema, user_id), SESSION_TTL_SECONDS, orjson.dumps(user_data))
+    except Exception as e:
+        # The cache is an optimization; never fail the request over it
+        logger.error(f"Failed to cache session for {user_id}: {str(e)}")
+
+
+async def get_cached_session(tenant_schema: str, user_id: str) -> Optional[Dict[str, Any]]:
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        data = await client.get(_session_key(tenant_schema, user_id))
+    except Exception as e:
+        logger.error(f"Failed to read cached session for {user_id}: {str(e)}")
+        return None
+    return orjson.loads(data) if data is not None else None
+
+
+async def drop_session(tenant_schema: str, user_id: str) -> None:
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        await client.delete(_session_key(tenant_schema, user_id))
+    except Exception as e:
+        logger.error(f"Failed to drop cached session for {user_id}: {str(e)}")
+
@@ -0,0 +1,50 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from typing import NamedTuple
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+class SpooledUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+
+async def spool_upload(file: UploadFile) -> SpooledUpload:
+    """
+    Stream an UploadFile to a named temp file in fixed-size chunks, hashing as it goes,
+    so the request never holds the whole file in memory. The caller owns the file and
+    must remove it (see discard_upload) once processing is done.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".upload")
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+            await asyncio.to_thread(tmp.write, chunk)
+    except Exception:
+        tmp.close()
+        discard_upload(tmp.name)
+        raise
+    tmp.close()
+    return SpooledUpload(path=tmp.name, sha256=digest.hexdigest(), size=size)
+
+
+def discard_upload(path: str) -> None:
+    """Remove a spooled upload, ignoring files that are already gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Failed to remove spooled upload {path}: {str(e)}")
@@ -0,0 +1,124 @@
+# api/worker.py
+"""
+Optional Celery worker for document ingestion.
+
+When CELERY_BROKER_URL is set, uploads are handed to a separate worker pool
+(`celery -A api.worker worker`) so text extraction and embedding never compete
+with request handling in the API process. Without a broker, processing falls
+back to FastAPI BackgroundTasks as before.
+
+Spooled uploads are passed by path, so workers must share the API's temp directory.
+Progress is reported through the knowledge_base status column either way.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import BackgroundTasks
+
+from api.config import CELERY_BROKER_URL
+from api.db.database import engine
+from api.services.kb_service import KnowledgeBaseService
+from api.services.rag_service import RAGService
+
+
+logger = logging.getLogger(__name__)
+
+celery_app = None
+if CELERY_BROKER_URL:
+    from celery import Celery
+
+    celery_app = Celery("crm_raag", broker=CELERY_BROKER_URL)
+    celery_app.conf.update(
+        task_serializer="json",
+        accept_content=["json"],
+        # Re-deliver a document if the worker dies mid-run; one long task per worker slot
+        task_acks_late=True,
+        worker_prefetch_multiplier=1,
+    )
+
+
+async def _run_document_task(
+    knowledge_base_id: str,
+    file_path: str,
+    mime_type: str,
+    user_id: str,
+    category_id: str,
+    tenant_schema: str,
+    file_hash: Optional[str] = None,
+) -> None:
+    # Services hold asyncio primitives, so build them inside this task's event loop
+    kb_service = KnowledgeBaseService(RAGService(embedding_model="google", api_key=None))
+    try:
+        await kb_service.process_document_background(
+            knowledge_base_id,
+            file_path,
+            mime_type,
+            user_id,
+            category_id,
+            tenant_schema,
+            file_hash,
+        )
+    finally:
+        # Pooled asyncpg connections are bound to the loop that opened them;
+        # release them before asyncio.run closes this one
+        await engine.dispose()
+
+
+def process_document(
+    knowledge_base_id: str,
+    file_path: str,
+    mime_type: str,
+    user_id: str,
+    category_id: str,
+    tenant_schema: str,
+    file_hash: Optional[str] = None,
+) -> None:
+    """Synchronous entry point run by the Celery worker for one uploaded document."""
+    asyncio.run(
+        _run_document_task(
+            knowledge_base_id,
+            file_path,
+            mime_type,
+            user_id,
+            category_id,
+            tenant_schema,
+            file_hash,
+        )
+    )
+
+
+process_document_task = (
+    celery_app.task(name="kb.process_document")(process_document)
+    if celery_app is not None
+    else None
+)
+
+
+def enqueue_document_processing(
+    background_tasks: BackgroundTasks,
+    kb_service: KnowledgeBaseService,
+    knowledge_base_id: str,
+    file_path: str,
+    mime_type: str,
+    user_id: str,
+    category_id: str,
+    tenant_schema: str,
+    file_hash: Optional[str] = None,
+) -> None:
+    """Queue document processing on the Celery worker pool, or in-process if no broker is configured."""
+    if process_document_task is not None:
+        process_document_task.delay(
+            knowledge_base_id, file_path, mime_type, user_id, category_id, tenant_schema, file_hash
+        )
+        return
+    background_tasks.add_task(
+        kb_service.process_document_background,
+        knowledge_base_id,
+        file_path,
+        mime_type,
+        user_id,
+        category_id,
+        tenant_schema,
+        file_hash,
+    )
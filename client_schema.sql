@@ -30,7 +30,7 @@ CREATE TABLE IF NOT EXISTS users (
 -- Categories table
 CREATE TABLE IF NOT EXISTS categories (
     id VARCHAR(36) PRIMARY KEY DEFAULT uuid_generate_v4(),
-    name VARCHAR(255) NOT NULL,
+    name VARCHAR(255) NOT NULL UNIQUE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -55,6 +55,7 @@ CREATE TABLE IF NOT EXISTS knowledge_base (
     s3_url TEXT,
     mime VARCHAR(255),
     file_size INTEGER,
+    file_hash VARCHAR(64),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
@@ -70,7 +71,7 @@ CREATE TABLE IF NOT EXISTS vector_doc (
     chunk_id INTEGER NOT NULL,
     chunk_text TEXT NOT NULL,
     chunk_hash VARCHAR(64),
-    embedding vector(768) NOT NULL,
+    embedding halfvec(768) NOT NULL,
     doc_metadata JSONB,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
@@ -143,16 +144,26 @@ CREATE INDEX IF NOT EXISTS idx_knowledge_base_user_id ON knowledge_base(user_id)
 CREATE INDEX IF NOT EXISTS idx_knowledge_base_category_id ON knowledge_base(category_id);
 CREATE INDEX IF NOT EXISTS idx_knowledge_base_status ON knowledge_base(status);
 CREATE INDEX IF NOT EXISTS idx_knowledge_base_created_at ON knowledge_base(created_at);
+CREATE INDEX IF NOT EXISTS ix_knowledge_base_file_hash ON knowledge_base(file_hash);
+-- Covering index for the paginated per-user document listing (newest first)
+CREATE INDEX IF NOT EXISTS ix_kb_user_created ON knowledge_base(user_id, created_at DESC) INCLUDE (file_name, category_id, mime, file_size, status, s3_url);
+
+-- Chat History indexes
+-- Keyset pagination of the tenant-wide chat history listing (newest first)
+CREATE INDEX IF NOT EXISTS ix_chat_history_created_id ON chat_history(created_at, id);
 
 -- Vector Documents indexes
 CREATE INDEX IF NOT EXISTS idx_vector_doc_user_id ON vector_doc(user_id);
 CREATE INDEX IF NOT EXISTS idx_vector_doc_category_id ON vector_doc(category_id);
 CREATE INDEX IF NOT EXISTS idx_vector_doc_file_id ON vector_doc(file_id);
 CREATE INDEX IF NOT EXISTS idx_vector_doc_chunk_id ON vector_doc(chunk_id);
-CREATE INDEX IF NOT EXISTS idx_vector_doc_embedding ON vector_doc USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+-- Embeddings are stored as halfvec(768), so the HNSW index is half the size of a vector(768) one
+CREATE INDEX IF NOT EXISTS idx_vector_doc_embedding_hnsw_halfvec ON vector_doc USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
 
 -- Chat Tabs indexes
 CREATE INDEX IF NOT EXISTS idx_chat_tabs_user_id ON chat_tabs(user_id);
+-- One default "KB Chat" tab per user (backs the get-or-create upsert)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_chat_tabs_user_kb_chat ON chat_tabs(user_id, name) WHERE name = 'KB Chat';
 
 -- Chat History indexes
 CREATE INDEX IF NOT EXISTS idx_chat_history_created_at ON chat_history(created_at);
@@ -245,6 +256,7 @@ COMMENT ON COLUMN vector_doc.embedding IS '768-dimensional vector embedding for
 COMMENT ON COLUMN vector_doc.chunk_hash IS 'SHA-256 hash to prevent duplicate chunks';
 COMMENT ON COLUMN vector_doc.doc_metadata IS 'Additional metadata for the document chunk';
 COMMENT ON COLUMN knowledge_base.status IS 'Current processing status of the document';
+COMMENT ON COLUMN knowledge_base.file_hash IS 'SHA-256 of the uploaded file, used to reuse vectors for duplicate uploads';
 COMMENT ON COLUMN chat_history.citation IS 'Source citations for the generated response';
 COMMENT ON COLUMN chat_history.latency IS 'Response generation time in milliseconds';
 COMMENT ON COLUMN audit_logs.details IS 'Additional details about the audit event';
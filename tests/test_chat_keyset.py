@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from api.models.chat_history import ChatHistory
+from api.services.chat_service import ChatHistoryService
+
+
+async def _page_through(rows, limit):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(ChatHistory.__table__.create)
+    try:
+        async with AsyncSession(engine) as session:
+            await session.execute(insert(ChatHistory), rows)
+            await session.commit()
+
+            service = ChatHistoryService(session)
+            pages = []
+            cursor = (None, None)
+            while True:
+                page = await service.get_all_chat_records(limit, *cursor)
+                if not page:
+                    return pages
+                pages.append([row.id for row in page])
+                # The next cursor is the (created_at, id) of the last row seen
+                cursor = (page[-1].created_at, page[-1].id)
+    finally:
+        await engine.dispose()
+
+
+def _rows():
+    base = datetime(2025, 1, 1, 12, 0, 0)
+    rows = []
+    for i in range(7):
+        # Pairs of rows share a timestamp, so the id has to break the tie
+        created_at = base + timedelta(seconds=i // 2)
+        rows.append({
+            "id": f"{i:02d}",
+            "question": f"q{i}",
+            "answer": f"a{i}",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return rows
+
+
+def test_pages_are_newest_first_without_gaps_or_repeats():
+    pages = asyncio.run(_page_through(_rows(), limit=3))
+
+    assert pages == [["06", "05", "04"], ["03", "02", "01"], ["00"]]
+
+
+def test_cursor_on_a_timestamp_tie_resumes_after_that_row():
+    pages = asyncio.run(_page_through(_rows(), limit=2))
+
+    # Each page ends mid-pair except the last, so the id half of the key is exercised
+    assert [row_id for page in pages for row_id in page] == ["06", "05", "04", "03", "02", "01", "00"]
+    assert pages[1] == ["04", "03"]
@@ -0,0 +1,44 @@
+import base64
+
+import numpy as np
+
+from api.utils.embedding_codec import decode_embedding_b64, encode_embedding_b64
+
+
+def test_round_trip_preserves_float32_values():
+    values = np.random.default_rng(0).standard_normal(768).astype(np.float32)
+
+    decoded = decode_embedding_b64(encode_embedding_b64(values))
+
+    assert decoded.shape == (768,)
+    np.testing.assert_array_equal(decoded, values)
+
+
+def test_round_trip_from_list():
+    values = [0.0, 1.5, -2.25, 3.0e-3]
+
+    decoded = decode_embedding_b64(encode_embedding_b64(values))
+
+    np.testing.assert_allclose(decoded, values, rtol=1e-7)
+
+
+def test_wire_format_is_big_endian_float32():
+    raw = base64.b64decode(encode_embedding_b64([1.0, -2.0]))
+
+    # 4 bytes per dimension, most significant byte first
+    assert raw == b"\x3f\x80\x00\x00\xc0\x00\x00\x00"
+
+
+def test_little_endian_input_is_byteswapped():
+    little = np.array([1.0, 0.5], dtype="<f4")
+
+    encoded = encode_embedding_b64(little)
+
+    assert base64.b64decode(encoded) == np.array([1.0, 0.5], dtype=">f4").tobytes()
+    np.testing.assert_array_equal(decode_embedding_b64(encoded), little)
+
+
+def test_decode_accepts_bytes():
+    encoded = encode_embedding_b64([0.25, 4.0]).encode("ascii")
+
+    np.testing.assert_array_equal(decode_embedding_b64(encoded), [0.25, 4.0])
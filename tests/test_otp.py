@@ -0,0 +1,237 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from api.services import auth_service
+from api.services.auth_service import AuthService
+from api.utils import otp_store
+from api.utils.otp_store import OTP_MAX_ATTEMPTS, OTP_TTL_SECONDS
+
+
+class _FakeRedis:
+    """The slice of redis.asyncio used by otp_store, with a hand-driven clock."""
+
+    def __init__(self):
+        self.now = 0.0
+        self._data = {}
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self.now:
+            del self._data[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def delete(self, *keys):
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def setex(self, key, seconds, value):
+        self._data[key] = (str(value).encode(), self.now + seconds)
+        return True
+
+    def incr(self, key):
+        entry = self._live(key)
+        count = int(entry[0]) + 1 if entry else 1
+        self._data[key] = (str(count).encode(), entry[1] if entry else None)
+        return count
+
+    def expire(self, key, seconds):
+        entry = self._live(key)
+        if entry is None:
+            return False
+        self._data[key] = (entry[0], self.now + seconds)
+        return True
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self._ops.append((name, args))
+        return queue
+
+    async def execute(self):
+        results = []
+        for name, args in self._ops:
+            result = getattr(self._redis, name)(*args)
+            if asyncio.iscoroutine(result):
+                result = await result
+            results.append(result)
+        self._ops = []
+        return results
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.setattr(otp_store, "get_redis", lambda: fake)
+    return fake
+
+
+def _verify(service, email, code):
+    return asyncio.run(service.verify_otp(email, code))
+
+
+# --- Redis store ---
+
+def test_otp_expires_after_ttl(redis):
+    asyncio.run(otp_store.store_otp("a@example.com", 123456))
+
+    redis.now = OTP_TTL_SECONDS - 1
+    assert asyncio.run(otp_store.get_otp("a@example.com")) == "123456"
+
+    redis.now = OTP_TTL_SECONDS
+    assert asyncio.run(otp_store.get_otp("a@example.com")) is None
+
+
+def test_new_code_resets_failed_attempts(redis):
+    asyncio.run(otp_store.store_otp("a@example.com", 111111))
+    for _ in range(3):
+        asyncio.run(otp_store.record_failed_attempt("a@example.com"))
+    assert asyncio.run(otp_store.failed_attempts("a@example.com")) == 3
+
+    asyncio.run(otp_store.store_otp("a@example.com", 222222))
+
+    assert asyncio.run(otp_store.failed_attempts("a@example.com")) == 0
+
+
+def test_verify_rejects_after_max_attempts_even_with_the_right_code(redis):
+    service = AuthService(session=None)
+    asyncio.run(otp_store.store_otp("a@example.com", 123456))
+
+    for _ in range(OTP_MAX_ATTEMPTS):
+        with pytest.raises(HTTPException) as exc:
+            _verify(service, "a@example.com", 999999)
+        assert exc.value.status_code == 400
+
+    with pytest.raises(HTTPException) as exc:
+        _verify(service, "a@example.com", 123456)
+    assert exc.value.status_code == 429
+
+
+def test_verified_code_cannot_be_replayed(redis):
+    service = AuthService(session=None)
+    asyncio.run(otp_store.store_otp("a@example.com", 123456))
+
+    assert _verify(service, "a@example.com", 123456).status_code == 200
+
+    with pytest.raises(HTTPException) as exc:
+        _verify(service, "a@example.com", 123456)
+    assert exc.value.status_code == 400
+
+
+def test_verify_after_ttl_reports_expired(redis):
+    service = AuthService(session=None)
+    asyncio.run(otp_store.store_otp("a@example.com", 123456))
+    redis.now = OTP_TTL_SECONDS
+
+    with pytest.raises(HTTPException) as exc:
+        _verify(service, "a@example.com", 123456)
+    assert exc.value.status_code == 400
+
+
+# --- Postgres fallback (no REDIS_URL) ---
+
+class _FakeOTPSession:
+    """Serves one OTP row to verify_otp and applies its attempts increment and delete."""
+
+    def __init__(self, row):
+        self.row = row
+        self.commits = 0
+
+    async def execute(self, stmt):
+        if stmt.is_select:
+            return SimpleNamespace(scalar_one_or_none=lambda: self.row)
+        # The only UPDATE on this path is attempts = attempts + 1
+        self.row.attempts += 1
+        return None
+
+    async def scalar(self, stmt):
+        # DELETE ... RETURNING id of the matched row
+        assert stmt.is_delete
+        row, self.row = self.row, None
+        return row.id if row is not None else None
+
+    async def commit(self):
+        self.commits += 1
+
+
+def _otp_row(code=123456, expires_in=datetime.timedelta(minutes=5)):
+    return SimpleNamespace(
+        id="otp-1",
+        otp=code,
+        attempts=0,
+        expires_at=datetime.datetime.utcnow() + expires_in,
+    )
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    monkeypatch.setattr(auth_service, "otp_store_enabled", lambda: False)
+
+
+def test_db_fallback_counts_wrong_guesses_and_caps_them(no_redis):
+    session = _FakeOTPSession(_otp_row())
+    service = AuthService(session)
+
+    for _ in range(OTP_MAX_ATTEMPTS):
+        with pytest.raises(HTTPException) as exc:
+            _verify(service, "a@example.com", 999999)
+        assert exc.value.status_code == 400
+
+    assert session.row.attempts == OTP_MAX_ATTEMPTS
+    assert session.commits == OTP_MAX_ATTEMPTS
+
+    with pytest.raises(HTTPException) as exc:
+        _verify(service, "a@example.com", 123456)
+    assert exc.value.status_code == 429
+
+
+def test_db_fallback_accepts_the_right_code_under_the_cap(no_redis):
+    session = _FakeOTPSession(_otp_row())
+    session.row.attempts = OTP_MAX_ATTEMPTS - 1
+
+    assert _verify(AuthService(session), "a@example.com", 123456).status_code == 200
+
+
+def test_db_fallback_code_is_single_use(no_redis):
+    session = _FakeOTPSession(_otp_row())
+    service = AuthService(session)
+
+    assert _verify(service, "a@example.com", 123456).status_code == 200
+    assert session.row is None
+
+    with pytest.raises(HTTPException) as exc:
+        _verify(service, "a@example.com", 123456)
+    assert exc.value.status_code == 400
+
+
+def test_db_fallback_rejects_an_expired_code(no_redis):
+    session = _FakeOTPSession(_otp_row(expires_in=datetime.timedelta(seconds=-1)))
+
+    with pytest.raises(HTTPException) as exc:
+        _verify(AuthService(session), "a@example.com", 123456)
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "OTP expired"
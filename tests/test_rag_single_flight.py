@@ -0,0 +1,102 @@
+import asyncio
+
+from api.services.rag_service import RAGService
+
+
+class _CountingEmbedder:
+    """Stands in for RAGService._generate_embeddings; blocks until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        await self.release.wait()
+        if texts[0] == "boom":
+            raise RuntimeError("provider down")
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def _service(embedder):
+    service = RAGService(embedding_model="google", api_key="test-key")
+    service._generate_embeddings = embedder
+    return service
+
+
+def test_concurrent_identical_queries_share_one_embedding_call():
+    async def scenario():
+        embedder = _CountingEmbedder()
+        service = _service(embedder)
+        waiters = [asyncio.create_task(service.embed_query("refund policy")) for _ in range(5)]
+        await asyncio.sleep(0)
+        embedder.release.set()
+        results = await asyncio.gather(*waiters)
+        return embedder.calls, results, service._inflight_queries
+
+    calls, results, inflight = asyncio.run(scenario())
+
+    assert calls == [["refund policy"]]
+    assert results == [[13.0, 1.0]] * 5
+    assert inflight == {}
+
+
+def test_distinct_queries_are_not_coalesced():
+    async def scenario():
+        embedder = _CountingEmbedder()
+        service = _service(embedder)
+        embedder.release.set()
+        return embedder.calls, await asyncio.gather(service.embed_query("a"), service.embed_query("bb"))
+
+    calls, results = asyncio.run(scenario())
+
+    assert sorted(calls) == [["a"], ["bb"]]
+    assert results == [[1.0, 1.0], [2.0, 1.0]]
+
+
+def test_finished_query_is_embedded_again_on_the_next_call():
+    async def scenario():
+        embedder = _CountingEmbedder()
+        service = _service(embedder)
+        embedder.release.set()
+        await service.embed_query("again")
+        await service.embed_query("again")
+        return embedder.calls
+
+    assert asyncio.run(scenario()) == [["again"], ["again"]]
+
+
+def test_cancelling_one_waiter_does_not_cancel_the_shared_call():
+    async def scenario():
+        embedder = _CountingEmbedder()
+        service = _service(embedder)
+        first = asyncio.create_task(service.embed_query("shared"))
+        second = asyncio.create_task(service.embed_query("shared"))
+        await asyncio.sleep(0)
+        first.cancel()
+        embedder.release.set()
+        result = await second
+        return first.cancelled(), result, embedder.calls
+
+    first_cancelled, result, calls = asyncio.run(scenario())
+
+    assert first_cancelled
+    assert result == [6.0, 1.0]
+    assert calls == [["shared"]]
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    async def scenario():
+        embedder = _CountingEmbedder()
+        service = _service(embedder)
+        waiters = [asyncio.create_task(service.embed_query("boom")) for _ in range(3)]
+        await asyncio.sleep(0)
+        embedder.release.set()
+        outcomes = await asyncio.gather(*waiters, return_exceptions=True)
+        return outcomes, service._inflight_queries, embedder.calls
+
+    outcomes, inflight, calls = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert inflight == {}